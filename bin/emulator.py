@@ -0,0 +1,53 @@
+import argparse
+import time
+from snowhite.emulator import SnowWhiteEmulator
+
+
+def run_emulator():
+    """
+    Arranca bombas snowwhite virtuales sobre pseudo-terminales.
+
+    Cada bomba virtual contesta a la consulta "poll" con una trama
+    de ancho fijo como la bomba real. Se muestran los puertos creados
+    y se mantienen activos hasta pulsar Ctrl+C.
+
+    :return: None
+    """
+
+    # Configura el analizador de argumentos
+    parser = argparse.ArgumentParser(
+        description="Emulador de bombas de alto flujo Snowwhite")
+    parser.add_argument('--bombas', type=int, default=1,
+                        help='Numero de bombas virtuales')
+    parser.add_argument('--latencia', type=float, default=0.15,
+                        help='Retardo de respuesta en segundos')
+    parser.add_argument('--jitter', type=float, default=0.05,
+                        help='Variacion maxima del retardo en segundos')
+    parser.add_argument('--corrupcion', type=float, default=0.0,
+                        help='Probabilidad de trama corrupta (0 a 1)')
+    parser.add_argument('--encendido', type=float, default=3600.0,
+                        help='Segundos de bomba encendida por ciclo')
+    parser.add_argument('--apagado', type=float, default=0.0,
+                        help='Segundos de bomba apagada por ciclo')
+
+    args = parser.parse_args()
+
+    emulator = SnowWhiteEmulator(args.bombas,
+                                 latency=args.latencia,
+                                 jitter=args.jitter,
+                                 corruption=args.corrupcion,
+                                 cycle_on=args.encendido,
+                                 cycle_off=args.apagado)
+    emulator.start()
+
+    print('Puertos de las bombas virtuales:')
+    for port in emulator.ports:
+        print(port)
+
+    try:
+        while True:
+            time.sleep(10)
+    except KeyboardInterrupt:
+        for stats in emulator.stats():
+            print(stats)
+        emulator.stop()
@@ -0,0 +1,45 @@
+import argparse
+from snowhite.jsonimport import import_json
+
+
+def import_outputs():
+    """
+    Importa en la base de datos las salidas JSON de la aplicacion de
+    escritorio.
+
+    Lee en paralelo los ficheros snowwhite_ultimahora.json,
+    snowwhite_datoshorarios_*.json y filtros_*.json de la carpeta de
+    salida, junto con sus diarios .jsonl si los hay, y los escribe por
+    bloques en las tablas de la base de datos. Los ficheros que no se
+    pueden leer se informan y se saltan.
+
+    :return: None
+    """
+
+    # Configura el analizador de argumentos
+    parser = argparse.ArgumentParser(
+        description="Importa las salidas JSON de la aplicacion Snowwhite \
+        en la base de datos SQLite")
+    parser.add_argument('--db',
+                        type=str,
+                        required=True,
+                        help='Archivo de la base de datos SQLite')
+    parser.add_argument('--carpeta',
+                        type=str,
+                        required=True,
+                        help='Carpeta de salida de la aplicacion '
+                        '(Output_Snowwhite)')
+    parser.add_argument('--procesos',
+                        type=int,
+                        default=None,
+                        help='Numero de procesos de lectura')
+    parser.add_argument('--bloque',
+                        type=int,
+                        default=100000,
+                        help='Numero de filas por transaccion')
+
+    args = parser.parse_args()
+
+    counts = import_json(args.db, args.carpeta, args.procesos, args.bloque)
+    for table in counts:
+        print(table + ': ' + str(counts[table]) + ' filas')
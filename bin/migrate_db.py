@@ -0,0 +1,36 @@
+import argparse
+from snowhite.dbdump import migrate_database
+
+
+def migrate_db():
+    """
+    Migra una base de datos al esquema de fechas enteras.
+
+    Convierte en el sitio y por bloques las fechas guardadas como
+    texto a milisegundos desde 1970 y las duraciones a segundos.
+
+    :return: None
+    """
+
+    # Configura el analizador de argumentos
+    parser = argparse.ArgumentParser(
+        description="Migra la base de datos de la bomba de alto flujo \
+        Snowwhite al esquema de fechas enteras")
+    parser.add_argument('--db',
+                        type=str,
+                        required=True,
+                        help='Archivo de la base de datos SQLite')
+    parser.add_argument('--bloque',
+                        type=int,
+                        default=100000,
+                        help='Numero de filas convertidas por bloque')
+    parser.add_argument('--sin-vacuum',
+                        action='store_true',
+                        help='No compacta el archivo al terminar')
+
+    args = parser.parse_args()
+
+    if migrate_database(args.db, args.bloque, not args.sin_vacuum):
+        print('Base de datos migrada: ' + args.db)
+    else:
+        print('La base de datos ya usa el esquema de fechas enteras')
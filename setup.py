@@ -13,6 +13,9 @@ setup(
     entry_points={
         'console_scripts': [
             'datoreal=bin.instant_data:fetch_idata',
+            'swemulador=bin.emulator:run_emulator',
+            'swmigrar=bin.migrate_db:migrate_db',
+            'swimportar=bin.import_json:import_outputs',
         ],
     },
 )
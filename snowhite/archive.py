@@ -0,0 +1,172 @@
+import os
+from pathlib import Path
+import pandas as pd
+from snowhite.dbdump import FileDataBase
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional: solo lo necesita el archivo
+    pa = None
+
+# Esquema de los ficheros del archivo: fechas en milisegundos (UTC) y
+# duraciones en segundos, como en el esquema 2 de la base de datos
+ARCHIVE_SCHEMA = [
+    ('FECHA', 'timestamp[ms]'),
+    ('FECHA_MEDIDA', 'timestamp[ms]'),
+    ('DURACION', 'int32'),
+    ('ACTIVO', 'int8'),
+    ('DIFPRESION', 'float64'),
+    ('CAUDAL', 'float64'),
+    ('VOLUMEN_INC', 'float64'),
+    ('VOLUMEN_CUM', 'float64')
+]
+
+ARCHIVE_MARK = 'Archivo_Tiempo_Real'
+
+
+def check_pyarrow():
+    if pa is None:
+        raise ImportError('El archivo columnar necesita pyarrow: '
+                          'pip install pyarrow')
+
+
+def archive_path(folder, day):
+    # Particionado por año y mes: year=2024/month=05/valores_20240517.parquet
+    return (Path(folder) / ('year=' + day.strftime('%Y')) /
+            ('month=' + day.strftime('%m')) /
+            ('valores_' + day.strftime('%Y%m%d') + '.parquet'))
+
+
+def day_table(db, day):
+    # Filas de tiempo real de un dia como tabla Arrow
+    values = db.get_dataframe(
+        'SELECT * FROM Valores_Tiempo_Real ' +
+        'WHERE FECHA >= ? AND FECHA < ? ORDER BY FECHA',
+        (db.encode_time(day), db.encode_time(day + pd.Timedelta(days=1))))
+    if values.empty:
+        return None
+
+    values['FECHA'] = db.decode_time(values['FECHA'])
+    values['FECHA_MEDIDA'] = db.decode_time(values['FECHA_MEDIDA'])
+    if db.version < 2:
+        values['DURACION'] = pd.to_timedelta(
+            values['DURACION'].replace('', None)).dt.total_seconds()
+
+    schema = pa.schema([(name, pa.type_for_alias(alias))
+                        for name, alias in ARCHIVE_SCHEMA])
+    return pa.Table.from_pandas(values[schema.names], schema=schema,
+                                preserve_index=False, safe=False)
+
+
+def archive_days(filedb, folder, purge=False, compression='zstd'):
+    # Compacta los dias cerrados de Valores_Tiempo_Real en un fichero
+    # Parquet por dia. Se continua desde la marca 'Archivo_Tiempo_Real' de
+    # Ultimos_Valores y, si purge=True, se borran las filas archivadas.
+    # Los dias se leen con la conexion de solo lectura. Devuelve la lista
+    # de ficheros escritos
+    check_pyarrow()
+    db = FileDataBase(filedb)
+    reader = FileDataBase(filedb, readonly=True)
+    db.cursor.execute('INSERT OR IGNORE INTO Ultimos_Valores (TIPO, FECHA) '
+                      'VALUES (?, NULL)', (ARCHIVE_MARK,))
+    db.connection.commit()
+
+    marks = dict(db.cursor.execute(
+        'SELECT TIPO, FECHA FROM Ultimos_Valores').fetchall())
+    lastrt = db.decode_time(
+        pd.Series([marks['Valores_Tiempo_Real']])).iloc[0]
+    firstrt = db.cursor.execute(
+        'SELECT MIN(FECHA) FROM Valores_Tiempo_Real').fetchone()[0]
+    if pd.isna(lastrt) or firstrt is None:
+        reader.close()
+        db.close()
+        return []
+
+    # Un dia esta cerrado cuando ya hay datos de un dia posterior
+    endday = lastrt.floor('D')
+    day = db.decode_time(pd.Series([marks[ARCHIVE_MARK]])).iloc[0]
+    if pd.isna(day):
+        day = db.decode_time(pd.Series([firstrt])).iloc[0].floor('D')
+
+    written = []
+    while day < endday:
+        table = day_table(reader, day)
+        nextday = day + pd.Timedelta(days=1)
+        if table is not None:
+            # Escritura atomica: fichero temporal y rename
+            path = archive_path(folder, day)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmppath = path.with_suffix('.tmp')
+            pq.write_table(table, tmppath, compression=compression)
+            os.replace(tmppath, path)
+            written.append(path)
+
+        with db.connection:
+            if purge and table is not None:
+                db.cursor.execute(
+                    'DELETE FROM Valores_Tiempo_Real ' +
+                    'WHERE FECHA >= ? AND FECHA < ?',
+                    (db.encode_time(day), db.encode_time(nextday)))
+            db.cursor.execute(
+                'UPDATE Ultimos_Valores SET FECHA=? WHERE TIPO=?',
+                (db.encode_time(nextday), ARCHIVE_MARK))
+        day = nextday
+
+    reader.close()
+    db.close()
+    return written
+
+
+def archive_files(folder, start=None, end=None):
+    # Ficheros del archivo que solapan con [start, end). La poda se hace
+    # por el nombre de las particiones sin abrir ningun fichero
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+
+    files = []
+    for yearpath in sorted(Path(folder).glob('year=*')):
+        year = int(yearpath.name.split('=')[1])
+        if ((start is not None and year < start.year) or
+                (end is not None and year > end.year)):
+            continue
+        for monthpath in sorted(yearpath.glob('month=*')):
+            month = pd.Timestamp(year=year,
+                                 month=int(monthpath.name.split('=')[1]),
+                                 day=1)
+            if ((start is not None and
+                 month + pd.offsets.MonthBegin() <= start) or
+                    (end is not None and month >= end)):
+                continue
+            for path in sorted(monthpath.glob('valores_*.parquet')):
+                day = pd.Timestamp(path.stem.split('_')[1])
+                if ((start is not None and
+                     day + pd.Timedelta(days=1) <= start) or
+                        (end is not None and day >= end)):
+                    continue
+                files.append(path)
+    return files
+
+
+def read_archive(folder, start=None, end=None, columns=None):
+    # Lee del archivo solo los dias del intervalo [start, end) y solo las
+    # columnas pedidas, p. ej. columns=['FECHA', 'CAUDAL', 'DIFPRESION']
+    check_pyarrow()
+    files = archive_files(folder, start, end)
+    if not files:
+        names = [name for name, _ in ARCHIVE_SCHEMA]
+        return pd.DataFrame(columns=names if columns is None else columns)
+
+    dataset = ds.dataset([str(path) for path in files], format='parquet')
+    condition = None
+    if start is not None:
+        condition = ds.field('FECHA') >= pa.scalar(
+            pd.Timestamp(start).to_pydatetime(), pa.timestamp('ms'))
+    if end is not None:
+        endcondition = ds.field('FECHA') < pa.scalar(
+            pd.Timestamp(end).to_pydatetime(), pa.timestamp('ms'))
+        condition = (endcondition if condition is None else
+                     condition & endcondition)
+
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
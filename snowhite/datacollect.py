@@ -1,65 +1,118 @@
-from snowhite.swclient import SWClient
-from snowhite.dbdump import FileDataBase
-from snowhite.utils.timer import RepeatTimer
+from snowhite.swclient import SWClient, SERIAL_CONFIG
+from snowhite.dbdump import DataBaseWriter
+from snowhite.utils.timer import Scheduler, SKIP
 import pandas as pd
 import time
 
+# Campos sin los que no se puede integrar el volumen
+REQUIRED_FIELDS = ('actualdatetime', 'flowrate')
+
 
 class SnowWhiteDataCollect():
 
-    def __init__(self, filedb, interval):
+    def __init__(self, filedb, interval, serial_config=SERIAL_CONFIG,
+                 buffersize=20, flushtime=10.0, maxqueue=10000,
+                 scheduler=None):
 
-        self.sw = SWClient()
+        self.sw = SWClient(serial_config)
         self.interval = interval
         self.filedb = filedb
-        self.trigger = RepeatTimer(self.interval, self.collect)
-        self.trigger.start()
+
+        # Las filas se escriben desde un hilo aparte a traves de una cola
+        # acotada: la adquisicion nunca espera a la base de datos
+        self.writer = DataBaseWriter(self.filedb, maxqueue, buffersize,
+                                     flushtime)
+        self.writer.start()
 
         self.prev_values = {}
 
+        # Las tareas periodicas pueden compartir un planificador (un unico
+        # hilo con reloj monotono). Si una lectura se retrasa se salta al
+        # siguiente tick para no perder la rejilla de muestreo
+        self.ownscheduler = scheduler is None
+        self.scheduler = Scheduler() if scheduler is None else scheduler
+        self.job = self.scheduler.add(self.interval, self.collect,
+                                      policy=SKIP)
+        if self.ownscheduler:
+            self.scheduler.start()
+
     def collect(self):
 
-        # Lee la medida instantenea
-        data = self.sw.get_fmt_data()
+        # Lee la medida instantenea (registro del parser compilado)
+        data = self.sw.get_fmt_data(record=True)
+        if data is None:
+            print('Sin respuesta de la bomba')
+            return
 
-        fecha_medida = str(data['actualdatetime'][0])
-        duracion = str(data['duration'][0])
-        estado = data['status'][0]
-        difpresion = data['Pdiff'][0]
-        caudal = data['flowrate'][0]
-        volumen_cum = data['airvolume'][0]
-        fecha_inicio = str(data['startdatetime'][0])
+        # Trama incompleta o corrupta: se descarta
+        missing = [field for field in REQUIRED_FIELDS
+                   if getattr(data, field) is None or
+                   pd.isna(getattr(data, field))]
+        if missing:
+            print('Trama descartada, sin ' + ', '.join(missing) + ': ' +
+                  str(data))
+            return
+
+        fecha_medida = data.actualdatetime
+        duracion = data.duration
+        estado = data.status
+        difpresion = data.Pdiff
+        caudal = data.flowrate
+        volumen_cum = data.airvolume
+        fecha_inicio = data.startdatetime
 
         # Se calcula el volumen por la regal del trapecio
         if len(self.prev_values) == 0:
             Tsegs = 1.0
-            Qanterior = data['flowrate'][0]
+            Qanterior = data.flowrate
         else:
             # Calcular la diferencia
-            Tdiferencia = data['actualdatetime'][0] - self.prev_values['fecha']
+            Tdiferencia = data.actualdatetime - self.prev_values['fecha']
             Tsegs = Tdiferencia.total_seconds()
             Qanterior = self.prev_values['caudal']
 
         # Obtener la diferencia en segundos
-        volumen_inc = Tsegs * ((data['flowrate'][0] + Qanterior)/7200.0)
+        volumen_inc = Tsegs * ((data.flowrate + Qanterior)/7200.0)
+
+        self.prev_values['fecha'] = data.actualdatetime
+        self.prev_values['caudal'] = data.flowrate
 
-        self.prev_values['fecha'] = data['actualdatetime'][0]
-        self.prev_values['caudal'] = data['flowrate'][0]
+        self.writer.put((fecha_medida,
+                         fecha_inicio,
+                         duracion,
+                         estado,
+                         difpresion,
+                         caudal,
+                         volumen_inc,
+                         volumen_cum))
 
-        db = FileDataBase(self.filedb)
-        db.insert_data(fecha_medida,
-                       fecha_inicio,
-                       duracion,
-                       estado,
-                       difpresion,
-                       caudal,
-                       volumen_inc,
-                       volumen_cum)
-        db.close()
+    def stop(self):
+        # Para la toma de datos y escribe las filas pendientes. Se espera a
+        # que termine la lectura en curso para que su fila llegue al
+        # escritor antes de pararlo
+        self.scheduler.remove(self.job, wait=True)
+        if self.ownscheduler:
+            self.scheduler.cancel()
+            if self.scheduler.is_alive():
+                self.scheduler.join()
+        self.writer.stop()
 
 
 # EJEMPLO DE USO
-swdc = SnowWhiteDataCollect('registro_test.db', 0.5)
-time.sleep(150)  # It gets suspended for the given number of seconds
-print('Threading finishing')
-swdc.trigger.cancel()
+if __name__ == '__main__':
+    # Un unico planificador para la adquisicion, los valores horarios y
+    # los agregados
+    from snowhite.dataprocess import SnowWhiteDataProcess
+    from snowhite.rollups import SnowWhiteRollups
+
+    scheduler = Scheduler()
+    swdc = SnowWhiteDataCollect('registro_test.db', 0.5, scheduler=scheduler)
+    swdp = SnowWhiteDataProcess('registro_test.db', 60, scheduler=scheduler,
+                                rollups=SnowWhiteRollups('registro_test.db'))
+    scheduler.start()
+    time.sleep(150)  # It gets suspended for the given number of seconds
+    print('Threading finishing')
+    swdp.stop()
+    swdc.stop()
+    scheduler.cancel()
+    scheduler.join()
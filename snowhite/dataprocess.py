@@ -3,78 +3,78 @@ from snowhite.dbdump import FileDataBase
 from snowhite.utils.timer import RepeatTimer
 import time
 import pandas as pd
-from snowhite.dbdump import FileDataBase
-from snowhite.utils.timer import RepeatTimer
+from snowhite.dbdump import FileDataBase, acquire_manager, release_manager
+from snowhite.utils.timer import RepeatTimer, COALESCE
 
 
 class SnowWhiteDataProcess():
 
-    def __init__(self, filedb, interval):
+    def __init__(self, filedb, interval, scheduler=None, rollups=None):
 
         self.interval = interval
         self.filedb = filedb
+        # Agregados (SnowWhiteRollups) que se actualizan tras los valores
+        # horarios, de los que depende su retencion
+        self.rollups = rollups
 
-    def update_hourly_data(self):
-        db = FileDataBase(self.filedb)
-
-        # Consulta ultimos valores para detreminar que valores
-        # calcular los volumenes horarios
-        ultimos_valores = db.get_dataframe('SELECT * FROM Ultimos_Valores')
-        ultimos_valores['FECHA'] = pd.to_datetime(ultimos_valores['FECHA'])
-        ultimos_valores.set_index('TIPO', inplace=True)
-
-        datehourTR = ultimos_valores.loc['Valores_Tiempo_Real',
-                                         'FECHA'].floor('H')
-        datehourH = ultimos_valores.loc['Valores_Horarios', 'FECHA']
+        # Con un planificador (normalmente el mismo de la adquisicion) el
+        # calculo se registra como tarea cada interval segundos. Los ticks
+        # perdidos se agrupan en una sola ejecucion: el calculo es
+        # incremental
+        self.scheduler = scheduler
+        self.job = None
+        # Las conexiones de lectura compartidas se mantienen abiertas
+        # mientras se use el proceso y se cierran en stop()
+        self.manager = acquire_manager(filedb)
+        if scheduler is not None:
+            self.job = scheduler.add(self.interval, self.process,
+                                     policy=COALESCE)
 
-        # CALCULO DE LOS VALORES HORARIOS
-        if pd.isna(datehourH):
-            values_unproccessed = db.get_dataframe(
-                "SELECT * FROM Valores_Tiempo_Real " +
-                "WHERE FECHA <'" +
-                datehourTR.strftime('%Y-%m-%d %H:%M:%S') +
-                "'")
-        else:
-            values_unproccessed = db.get_dataframe(
-                "SELECT * FROM Valores_Tiempo_Real " +
-                "WHERE FECHA >='" +
-                datehourH.strftime('%Y-%m-%d %H:%M:%S') +
-                "' AND FECHA < '" +
-                datehourTR.strftime('%Y-%m-%d %H:%M:%S') +
-                "'")
-        # Convertir la columna FECHA a tipo datetime
-        values_unproccessed['FECHA'] = pd.to_datetime(
-            values_unproccessed['FECHA'])
-        values_unproccessed.set_index('FECHA', drop=False, inplace=True)
+    def process(self):
+        # Valores horarios y, despues, agregados y retencion
+        hourly_values = self.update_hourly_data()
+        if self.rollups is not None:
+            self.rollups.update()
+        return hourly_values
 
-        # Calcular el intervalo de tiempo en segundos entre cada fecha
-        intervalo = values_unproccessed['FECHA'].diff()
-        intervalo = intervalo.dt.total_seconds().fillna(0)
+    def stop(self):
+        # Quita la tarea esperando a que termine el calculo en curso y
+        # cierra las conexiones compartidas
+        if self.job is not None:
+            self.scheduler.remove(self.job, wait=True)
+            self.job = None
+        if self.manager is not None:
+            release_manager(self.manager)
+            self.manager = None
 
-        # Calcular el volumen en cada fecha (caudal * intervalo de tiempo)
-        values_unproccessed['volumen'] = ((values_unproccessed['CAUDAL']
-                                           / 3600.0)
-                                          * intervalo)
+    def update_hourly_data(self):
+        db = FileDataBase(self.filedb)
 
-        # Agrupar por las fechas redondeadas y calcular el valor acumulado
-        hourly_values = values_unproccessed.resample('H',
-                                                     closed='left',
-                                                     label='right').agg({
-                                                         'FECHA': 'max',
-                                                         'volumen': 'sum',
-                                                         'CAUDAL': 'mean'
-                                                     })
+        # Los valores horarios se calculan dentro de SQLite a partir de la
+        # ultima hora procesada (Ultimos_Valores)
+        start, end = db.update_hourly_data()
+        db.close()
+        if end is None:
+            return pd.DataFrame(columns=['FECHA', 'CAUDAL', 'VOLUMEN'])
 
-        for index, row in hourly_values.iterrows():
-            db.insert_hourly_data(str(index),
-                                  row['CAUDAL'],
-                                  row['volumen'],
-                                  str(str(index)))
+        # Se devuelven las horas calculadas (conexion de solo lectura)
+        db = FileDataBase(self.filedb, readonly=True)
+        if start is None:
+            hourly_values = db.get_dataframe(
+                "SELECT * FROM Valores_Horarios WHERE FECHA <= ?", (end,))
+        else:
+            hourly_values = db.get_dataframe(
+                "SELECT * FROM Valores_Horarios " +
+                "WHERE FECHA > ? AND FECHA <= ?", (start, end))
+        hourly_values['FECHA'] = db.decode_time(hourly_values['FECHA'])
+        hourly_values.set_index('FECHA', drop=False, inplace=True)
 
         db.close()
         return hourly_values
 
 
-swdproc = SnowWhiteDataProcess('snowdata.db', 0.5)
-q = swdproc.update_hourly_data()
-print(q)
+if __name__ == '__main__':
+    swdproc = SnowWhiteDataProcess('snowdata.db', 0.5)
+    q = swdproc.update_hourly_data()
+    print(q)
+    swdproc.stop()
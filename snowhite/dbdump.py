@@ -1,10 +1,228 @@
 import sqlite3
+import time
+import queue
+import threading
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+# Version del esquema de las bases de datos nuevas (PRAGMA user_version):
+# 0/1 fechas y duraciones como TEXT, 2 fechas como enteros en
+# milisegundos desde 1970 (UTC) y duraciones en segundos
+SCHEMA_VERSION = 2
+
+# Tablas del esquema 2: la fecha es la clave primaria de una tabla
+# WITHOUT ROWID, los datos quedan ordenados (agrupados) por fecha
+TABLES_V2 = {
+    'Valores_Tiempo_Real': '''(
+        FECHA INTEGER PRIMARY KEY,
+        FECHA_MEDIDA INTEGER,
+        DURACION INTEGER,
+        ACTIVO INTEGER,
+        DIFPRESION REAL,
+        CAUDAL REAL,
+        VOLUMEN_INC REAL,
+        VOLUMEN_CUM REAL
+        ) WITHOUT ROWID''',
+    'Valores_Horarios': '''(
+        FECHA INTEGER PRIMARY KEY,
+        CAUDAL REAL,
+        VOLUMEN REAL
+        ) WITHOUT ROWID''',
+    'Valores_Filtro': '''(
+        FECHA_MEDIDA INTEGER PRIMARY KEY,
+        DURACION INTEGER,
+        CAUDAL REAL,
+        VOLUMEN REAL
+        ) WITHOUT ROWID''',
+    'Ultimos_Valores': '''(
+        TIPO TEXT PRIMARY KEY,
+        FECHA INTEGER
+        ) WITHOUT ROWID'''
+}
+
+# Tablas de agregados (snowhite.rollups): se crean al usarlas, con FECHA
+# INTEGER o TEXT segun la version, y solo se migran si existen
+ROLLUP_TABLE = '''(
+        FECHA {timetype} PRIMARY KEY,
+        N INTEGER,
+        SUMA REAL,
+        SUMSQ REAL,
+        MINIMO REAL,
+        MAXIMO REAL,
+        VOLUMEN REAL
+        ) WITHOUT ROWID'''
+
+OPTIONAL_TABLES_V2 = {
+    table: ROLLUP_TABLE.format(timetype='INTEGER')
+    for table in ('Rollup_Minuto', 'Rollup_Hora', 'Rollup_Dia')
+}
+
+# Columnas de fechas y duraciones de cada tabla
+TIME_COLUMNS = {
+    'Valores_Tiempo_Real': (['FECHA', 'FECHA_MEDIDA'], ['DURACION']),
+    'Valores_Horarios': (['FECHA'], []),
+    'Valores_Filtro': (['FECHA_MEDIDA'], ['DURACION']),
+    'Ultimos_Valores': (['FECHA'], []),
+    'Rollup_Minuto': (['FECHA'], []),
+    'Rollup_Hora': (['FECHA'], []),
+    'Rollup_Dia': (['FECHA'], [])
+}
+
+
+def to_epoch_ms(value):
+    # Fecha (str, datetime o Timestamp) a milisegundos desde 1970
+    if value is None or value == '':
+        return None
+    value = pd.Timestamp(value)
+    if pd.isna(value):
+        return None
+    return value.value // 1000000
+
+
+def to_seconds(value):
+    # Duracion (str o Timedelta) a segundos enteros
+    if value is None or value == '':
+        return None
+    value = pd.Timedelta(value)
+    if pd.isna(value):
+        return None
+    return round(value.total_seconds())
+
+
+def series_to_epoch_ms(values):
+    # Version vectorizada de to_epoch_ms para la migracion
+    values = pd.to_datetime(values.replace('', None), errors='coerce')
+    return (values - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)
+
+
+def series_to_seconds(values):
+    # Version vectorizada de to_seconds para la migracion
+    values = pd.to_timedelta(values.replace('', None), errors='coerce')
+    return values.dt.total_seconds().round()
+
+
+class ConnectionManager():
+
+    # Conexiones compartidas de un archivo: una unica conexion de escritura
+    # y una conexion de solo lectura por hilo. Con WAL los lectores no
+    # bloquean al escritor ni el escritor a los lectores. La conexion de
+    # escritura pertenece al hilo que la pide primero (el hilo escritor):
+    # otro hilo solo la obtiene cuando ese hilo ha terminado, asi no se
+    # mezclan transacciones de hilos distintos. Los usuarios se cuentan
+    # (acquire_manager / release_manager) y al soltar el ultimo se cierran
+    # todas las conexiones.
+    def __init__(self, filedb, cache_size=-16000, synchronous='NORMAL',
+                 busy_timeout=5000):
+
+        self.filedb = filedb
+        self.cache_size = cache_size  # negativo: KiB
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout  # ms
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.writerconnection = None
+        self.writerthread = None
+        self.readers = []
+        self.users = 0
+
+    def configure(self, connection):
+        connection.execute('PRAGMA busy_timeout=' + str(self.busy_timeout))
+        connection.execute('PRAGMA cache_size=' + str(self.cache_size))
+        connection.execute('PRAGMA temp_store=MEMORY')
+
+    def writer(self):
+        # Conexion de escritura del hilo que la posee
+        with self.lock:
+            current = threading.current_thread()
+            if (self.writerthread is not None and
+                    self.writerthread is not current and
+                    self.writerthread.is_alive()):
+                raise RuntimeError('La conexion de escritura de ' +
+                                   str(self.filedb) + ' pertenece al hilo ' +
+                                   self.writerthread.name)
+            self.writerthread = current
+            if self.writerconnection is None:
+                connection = sqlite3.connect(self.filedb,
+                                             check_same_thread=False)
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute('PRAGMA synchronous=' + self.synchronous)
+                self.configure(connection)
+                self.writerconnection = connection
+            return self.writerconnection
+
+    def reader(self):
+        # Conexion de solo lectura del hilo que la pide
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            uri = Path(self.filedb).resolve().as_uri() + '?mode=ro'
+            connection = sqlite3.connect(uri, uri=True,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA query_only=ON')
+            self.configure(connection)
+            self.local.connection = connection
+            with self.lock:
+                self.readers.append(connection)
+        return connection
+
+    def close(self):
+        # Los lectores se cierran antes que el escritor: la ultima conexion
+        # en cerrarse hace el checkpoint y borra los ficheros -wal y -shm,
+        # y una de solo lectura no puede
+        with self.lock:
+            for connection in self.readers:
+                connection.close()
+            self.readers = []
+            self.local = threading.local()
+            if self.writerconnection is not None:
+                self.writerconnection.close()
+                self.writerconnection = None
+            self.writerthread = None
+
+
+# Un gestor de conexiones por archivo dentro del proceso
+MANAGERS = {}
+MANAGERS_LOCK = threading.Lock()
+
+
+def get_manager_locked(filedb):
+    # Con MANAGERS_LOCK tomado
+    key = str(Path(filedb).resolve())
+    if key not in MANAGERS:
+        MANAGERS[key] = ConnectionManager(filedb)
+    return MANAGERS[key]
+
+
+def get_manager(filedb):
+    # Gestor de filedb sin contarlo como usuario
+    with MANAGERS_LOCK:
+        return get_manager_locked(filedb)
+
+
+def acquire_manager(filedb):
+    # Gestor de filedb con un usuario mas
+    with MANAGERS_LOCK:
+        manager = get_manager_locked(filedb)
+        manager.users = manager.users + 1
+        return manager
+
+
+def release_manager(manager):
+    # Suelta un usuario. Con el ultimo se cierran las conexiones (y con
+    # ellas los ficheros -wal y -shm) y el gestor se olvida
+    with MANAGERS_LOCK:
+        manager.users = manager.users - 1
+        if manager.users > 0:
+            return
+        key = str(Path(manager.filedb).resolve())
+        if MANAGERS.get(key) is manager:
+            del MANAGERS[key]
+    manager.close()
+
 
 class FileDataBase():
-    def __init__(self, filedb):
+    def __init__(self, filedb, buffersize=None, flushtime=None,
+                 version=SCHEMA_VERSION, readonly=False, manager=None):
 
         # ruta al archivo de la base de datos
         filedb_path = Path(filedb)
@@ -14,18 +232,72 @@ class FileDataBase():
         else:
             filedb_exists = False
 
-        # Conectar a la base de datos SQLite
-        # (creará el archivo de base de datos si no existe)
-        self.connection = sqlite3.connect(filedb)
+        # Modo escritor: una sola conexion de larga duracion que acumula
+        # las filas y las escribe en bloque al llegar a buffersize filas o
+        # cuando han pasado flushtime segundos desde la ultima escritura
+        self.buffersize = buffersize
+        self.flushtime = flushtime
+        self.buffer = []
+        self.lastflush = time.monotonic()
+        # Filas confirmadas en la base de datos por flush
+        self.committed = 0
+        writer = buffersize is not None or flushtime is not None
+
+        # Con readonly=True o con un gestor de conexiones se usan las
+        # conexiones compartidas (lector por hilo o escritor unico). Un
+        # gestor pasado como argumento es del que llama; el que se obtiene
+        # aqui se suelta en close()
+        self.ownsmanager = readonly and manager is None
+        if self.ownsmanager:
+            manager = acquire_manager(filedb)
+        self.manager = manager
+
+        if manager is not None and not readonly:
+            self.connection = manager.writer()
+        elif manager is not None:
+            try:
+                self.connection = manager.reader()
+            except sqlite3.Error:
+                if self.ownsmanager:
+                    release_manager(manager)
+                raise
+        else:
+            # Conectar a la base de datos SQLite
+            # (creará el archivo de base de datos si no existe)
+            self.connection = sqlite3.connect(filedb,
+                                              check_same_thread=not writer)
 
         # Crear un objeto cursor para interactuar con la base de datos
         self.cursor = self.connection.cursor()
 
-        if filedb_exists is False:
+        if writer and manager is None:
+            # WAL: las escrituras no bloquean a los lectores y con
+            # synchronous=NORMAL solo se sincroniza el disco en los
+            # checkpoints, no en cada transaccion
+            self.cursor.execute('PRAGMA journal_mode=WAL')
+            self.cursor.execute('PRAGMA synchronous=NORMAL')
+
+        if filedb_exists is False and not readonly:
             # Se crea la base de datos
-            self.create_database()
+            self.create_database(version)
+
+        self.version = self.cursor.execute(
+            'PRAGMA user_version').fetchone()[0]
+
+    def create_database(self, version=SCHEMA_VERSION):
+        if version >= 2:
+            for table in TABLES_V2:
+                self.cursor.execute('CREATE TABLE IF NOT EXISTS ' + table +
+                                    ' ' + TABLES_V2[table])
+            self.cursor.executemany('''
+            INSERT INTO Ultimos_Valores (TIPO, FECHA)
+            VALUES (?, NULL)
+            ''', [('Valores_Tiempo_Real',), ('Valores_Horarios',),
+                  ('Valores_Filtro',)])
+            self.cursor.execute('PRAGMA user_version=' + str(version))
+            self.connection.commit()
+            return
 
-    def create_database(self):
         # Crear una tabla con las columnas especificadas y sus tipos
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS Valores_Tiempo_Real (
@@ -82,41 +354,79 @@ class FileDataBase():
         # Confirmar los cambios
         self.connection.commit()
 
+    def encode_time(self, value):
+        # Fecha en el formato de almacenamiento del esquema
+        if self.version >= 2:
+            return to_epoch_ms(value)
+        if isinstance(value, pd.Timestamp):
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        return value
+
+    def encode_duration(self, value):
+        if self.version >= 2:
+            return to_seconds(value)
+        return value if value is None else str(value)
+
+    def decode_time(self, values):
+        # Columna de fechas almacenadas a datetime
+        if self.version >= 2:
+            return pd.to_datetime(values, unit='ms')
+        return pd.to_datetime(values.replace('', None))
+
+    def decode_duration(self, values):
+        # Columna de duraciones almacenadas a timedelta
+        if self.version >= 2:
+            return pd.to_timedelta(values, unit='s')
+        return pd.to_timedelta(values.replace('', None))
+
     def insert_data(self, fecha_medida, fecha_inicio, duracion, estado,
                     difpresion, caudal, volumen_inc, volumen_cum):
-        try:
-            self.cursor.execute('''
-            INSERT INTO Valores_Tiempo_Real (FECHA, FECHA_MEDIDA ,DURACION,
-            ACTIVO, DIFPRESION, CAUDAL, VOLUMEN_INC, VOLUMEN_CUM)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (fecha_medida, fecha_inicio, duracion, estado,
-                  difpresion, caudal, volumen_inc, volumen_cum))
-
-            self.connection.commit()
-
-        except sqlite3.IntegrityError:
-            print('Valor ya registrado')
-            # self.cursor.execute('''
-            # UPDATE Valores_Tiempo_Real SET FECHA_MEDIDA=? ,DURACION=?,
-            # ACTIVO=?, DIFPRESION=?, CAUDAL=?, VOLUMEN=? WHERE FECHA=?
-            # ''', (fecha_inicio, duracion, estado,
-            #       difpresion, caudal, volumen, fecha_medida))
-
-            # self.connection.commit()
-
-        # Insertar ultimos datod registrado en ultimos valores
-        try:
+        self.buffer.append((self.encode_time(fecha_medida),
+                            self.encode_time(fecha_inicio),
+                            self.encode_duration(duracion), estado,
+                            difpresion, caudal, volumen_inc, volumen_cum))
+
+        # Fuera del modo escritor cada fila se escribe inmediatamente
+        if self.buffersize is None and self.flushtime is None:
+            self.flush()
+        elif (self.buffersize is not None and
+              len(self.buffer) >= self.buffersize):
+            self.flush()
+        elif (self.flushtime is not None and
+              time.monotonic() - self.lastflush >= self.flushtime):
+            self.flush()
+
+    def flush(self):
+        # Escribe las filas pendientes y actualiza Ultimos_Valores en una
+        # unica transaccion. Las filas solo salen del buffer si la
+        # transaccion se confirma; si falla se reintentan en el siguiente
+        # flush
+        self.lastflush = time.monotonic()
+        if len(self.buffer) == 0:
+            return
+
+        rows = self.buffer
+        with self.connection:
+            self.cursor.executemany('''
+            INSERT OR IGNORE INTO Valores_Tiempo_Real (FECHA, FECHA_MEDIDA,
+            DURACION, ACTIVO, DIFPRESION, CAUDAL, VOLUMEN_INC, VOLUMEN_CUM)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            duplicados = len(rows) - self.cursor.rowcount
+
+            # Insertar ultimos dato registrado en ultimos valores
             self.cursor.execute('''
             UPDATE Ultimos_Valores SET FECHA=? WHERE TIPO=?
-            ''', (fecha_medida, 'Valores_Tiempo_Real'))
-
-            self.connection.commit()
+            ''', (rows[-1][0], 'Valores_Tiempo_Real'))
+        self.committed = self.committed + len(rows)
+        self.buffer = []
 
-        except sqlite3.IntegrityError:
-            print('Error Ultimos_VALORES: El valor ' + fecha_medida +
-                  ' ya existe en la base de datos.')
+        if duplicados > 0:
+            print('Valor ya registrado: ' + str(duplicados) + ' filas')
 
     def insert_hourly_data(self, fecha, caudal, volumen, ultima_fecha):
+        fecha = self.encode_time(fecha)
+        ultima_fecha = self.encode_time(ultima_fecha)
         try:
             self.cursor.execute('''
             INSERT INTO Valores_Horarios (FECHA, CAUDAL, VOLUMEN)
@@ -144,9 +454,92 @@ class FileDataBase():
             self.connection.commit()
 
         except sqlite3.IntegrityError:
-            print('Error Ultimos_VALORES: El valor ' + fecha +
+            print('Error Ultimos_VALORES: El valor ' + str(fecha) +
                   ' ya existe en la base de datos.')
 
+    def volume_query(self, hasstart, maxgap=None):
+        # Subconsulta tiempo_real (hasta :end) con el volumen de cada
+        # muestra: caudal por el tiempo desde la muestra anterior (regla del
+        # rectangulo). Con hasstart se incluye la muestra anterior a :start
+        # para no perder el primer intervalo. Con maxgap los intervalos
+        # mayores que maxgap segundos (cortes) no suman volumen. Es el
+        # criterio comun de Valores_Horarios y de los agregados (rollups)
+        if self.version >= 2:
+            interval = '''(FECHA - LAG(FECHA) OVER (ORDER BY FECHA))
+                          / 1000.0'''
+        else:
+            # Redondeo al milisegundo: julianday tiene error de coma
+            # flotante (60 s pueden salir 60.000000x)
+            interval = '''ROUND((julianday(FECHA) -
+                           julianday(LAG(FECHA) OVER (ORDER BY FECHA)))
+                          * 86400.0, 3)'''
+
+        volume = 'CAUDAL / 3600.0 * INTERVALO'
+        if maxgap is not None:
+            volume = ('CASE WHEN INTERVALO <= ' + repr(float(maxgap)) +
+                      ' THEN ' + volume + ' END')
+
+        previous = 'FECHA < :end'
+        if hasstart:
+            previous = ('FECHA >= COALESCE((SELECT MAX(FECHA) FROM ' +
+                        'Valores_Tiempo_Real WHERE FECHA < :start), ' +
+                        ':start) AND ' + previous)
+        return '''
+            WITH intervalos AS (
+                SELECT FECHA, CAUDAL, ''' + interval + ''' AS INTERVALO
+                FROM Valores_Tiempo_Real
+                WHERE ''' + previous + '''
+            ), tiempo_real AS (
+                SELECT FECHA, CAUDAL, INTERVALO, ''' + volume + ''' AS VOLUMEN
+                FROM intervalos
+            )'''
+
+    def update_hourly_data(self):
+        # Agregacion horaria incremental dentro de SQLite: desde la marca de
+        # Valores_Horarios hasta la ultima hora completa de tiempo real se
+        # calculan el caudal medio y el volumen integrado con una sola
+        # sentencia y se insertan/actualizan en una unica transaccion.
+        # Devuelve el intervalo [inicio, fin) procesado (valores guardados)
+        marks = dict(self.cursor.execute(
+            'SELECT TIPO, FECHA FROM Ultimos_Valores').fetchall())
+
+        lastrt = self.decode_time(
+            pd.Series([marks['Valores_Tiempo_Real']])).iloc[0]
+        if pd.isna(lastrt):
+            return None, None
+        end = self.encode_time(lastrt.floor('H'))
+        start = marks['Valores_Horarios']
+        if start == '':
+            start = None
+
+        if self.version >= 2:
+            hour = '(FECHA / 3600000 + 1) * 3600000'
+        else:
+            hour = "strftime('%Y-%m-%d %H:00:00', FECHA, '+1 hour')"
+
+        where = 'FECHA < :end'
+        if start is not None:
+            where = 'FECHA >= :start AND ' + where
+
+        with self.connection:
+            # La hora se etiqueta con su final: [10:00, 11:00) -> 11:00
+            self.cursor.execute(
+                self.volume_query(start is not None) + '''
+            INSERT INTO Valores_Horarios (FECHA, CAUDAL, VOLUMEN)
+            SELECT ''' + hour + ''' AS HORA, AVG(CAUDAL), TOTAL(VOLUMEN)
+            FROM tiempo_real
+            WHERE ''' + where + '''
+            GROUP BY HORA
+            ON CONFLICT(FECHA) DO UPDATE SET
+            CAUDAL=excluded.CAUDAL, VOLUMEN=excluded.VOLUMEN
+            ''', {'start': start, 'end': end})
+
+            self.cursor.execute('''
+            UPDATE Ultimos_Valores SET FECHA=? WHERE TIPO=?
+            ''', (end, 'Valores_Horarios'))
+
+        return start, end
+
     def get_data(self):
         # Consultar la tabla para verificar la inserción de datos
         self.cursor.execute('SELECT * FROM valores')
@@ -154,13 +547,346 @@ class FileDataBase():
         for row in rows:
             print(row)
 
-    def get_dataframe(self, query):
+    def get_dataframe(self, query, params=None):
         # Consultar la tabla para verificar la inserción de datos
-        df = pd.read_sql_query(query, self.connection)
+        df = pd.read_sql_query(query, self.connection, params=params)
         return df
 
+    def iter_dataframe(self, query, params=None, chunksize=50000):
+        # Consulta por bloques: devuelve un generador de DataFrames de como
+        # mucho chunksize filas, sin cargar el resultado entero en memoria
+        return pd.read_sql_query(query, self.connection, params=params,
+                                 chunksize=chunksize)
+
+    def iter_range(self, table='Valores_Tiempo_Real', start=None, end=None,
+                   columns=None, chunksize=50000, asarrays=False):
+        # Filas de la tabla en el intervalo de fechas [start, end) por
+        # bloques, con las fechas y duraciones ya convertidas. Con
+        # asarrays=True cada bloque es un diccionario de arrays NumPy
+        timecols, durationcols = TIME_COLUMNS[table]
+        key = timecols[0]
+
+        names = [row[1] for row in self.connection.execute(
+            'PRAGMA table_info(' + table + ')')]
+        if columns is None:
+            columns = names
+        for column in columns:
+            if column not in names:
+                raise ValueError('Columna desconocida: ' + column)
+
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append(key + ' >= ?')
+            params.append(self.encode_time(pd.Timestamp(start)))
+        if end is not None:
+            conditions.append(key + ' < ?')
+            params.append(self.encode_time(pd.Timestamp(end)))
+
+        query = 'SELECT ' + ', '.join(columns) + ' FROM ' + table
+        if conditions:
+            query = query + ' WHERE ' + ' AND '.join(conditions)
+        query = query + ' ORDER BY ' + key
+
+        for chunk in self.iter_dataframe(query, params, chunksize):
+            for column in timecols:
+                if column in chunk:
+                    chunk[column] = self.decode_time(chunk[column])
+            for column in durationcols:
+                if column in chunk:
+                    chunk[column] = self.decode_duration(chunk[column])
+            if asarrays:
+                yield {column: chunk[column].to_numpy() for column in chunk}
+            else:
+                yield chunk
+
+    def export_csv(self, path, table='Valores_Tiempo_Real', start=None,
+                   end=None, columns=None, chunksize=50000):
+        # Exporta un intervalo a CSV bloque a bloque. Devuelve las filas
+        nrows = 0
+        with open(path, 'w', newline='') as csvfile:
+            for chunk in self.iter_range(table, start, end, columns,
+                                         chunksize):
+                chunk.to_csv(csvfile, header=(nrows == 0), index=False)
+                nrows = nrows + len(chunk)
+        return nrows
+
+    def integrate_volume(self, start=None, end=None, chunksize=50000):
+        # Reprocesado: volumen (m3) del intervalo por la regla del trapecio
+        # sobre el caudal (m3/h), arrastrando la ultima muestra entre
+        # bloques para no perder el tramo entre ellos
+        volume = 0.0
+        prevtime = None
+        prevflow = None
+        for chunk in self.iter_range('Valores_Tiempo_Real', start, end,
+                                     ['FECHA', 'CAUDAL'], chunksize,
+                                     asarrays=True):
+            times = chunk['FECHA']
+            flows = chunk['CAUDAL'].astype(float)
+            if prevtime is not None:
+                times = np.concatenate([[prevtime], times])
+                flows = np.concatenate([[prevflow], flows])
+            seconds = np.diff(times) / np.timedelta64(1, 's')
+            volume = volume + np.nansum(seconds *
+                                        (flows[1:] + flows[:-1]) / 7200.0)
+            prevtime = times[-1]
+            prevflow = flows[-1]
+        return volume
+
     def close(self):
-        self.connection.close()
+        self.flush()
+        self.cursor.close()
+        if self.manager is None:
+            self.connection.close()
+        elif self.ownsmanager:
+            release_manager(self.manager)
+
+
+def migrate_database(filedb, chunksize=100000, vacuum=True):
+    # Convierte en el sitio una base de datos con fechas TEXT al esquema 2.
+    # Cada tabla (y los agregados, si existen) se copia por bloques de
+    # chunksize filas a una tabla nueva y al final se sustituyen todas en
+    # una unica transaccion.
+    connection = sqlite3.connect(filedb)
+    cursor = connection.cursor()
+
+    version = cursor.execute('PRAGMA user_version').fetchone()[0]
+    if version >= 2:
+        connection.close()
+        return False
+
+    existing = {row[0] for row in cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    tables = dict(TABLES_V2)
+    tables.update({table: OPTIONAL_TABLES_V2[table]
+                   for table in OPTIONAL_TABLES_V2 if table in existing})
+
+    for table in tables:
+        newtable = table + '_v2'
+        timecols, durationcols = TIME_COLUMNS[table]
+        key = pd.read_sql_query('PRAGMA table_info(' + table + ')',
+                                connection)
+        key = key.loc[key.pk > 0, 'name'].iloc[0]
+
+        cursor.execute('DROP TABLE IF EXISTS ' + newtable)
+        cursor.execute('CREATE TABLE ' + newtable + ' ' + tables[table])
+        connection.commit()
+
+        lastkey = None
+        while True:
+            if lastkey is None:
+                chunk = pd.read_sql_query(
+                    'SELECT * FROM ' + table + ' ORDER BY ' + key +
+                    ' LIMIT ?', connection, params=(chunksize,))
+            else:
+                chunk = pd.read_sql_query(
+                    'SELECT * FROM ' + table + ' WHERE ' + key + ' > ?' +
+                    ' ORDER BY ' + key + ' LIMIT ?', connection,
+                    params=(lastkey, chunksize))
+            if chunk.empty:
+                break
+            lastkey = chunk[key].iloc[-1]
+
+            for column in timecols:
+                chunk[column] = series_to_epoch_ms(chunk[column])
+            for column in durationcols:
+                chunk[column] = series_to_seconds(chunk[column])
+            for column in timecols + durationcols:
+                chunk[column] = chunk[column].astype('Int64')
+
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            cursor.executemany(
+                'INSERT OR IGNORE INTO ' + newtable + ' (' +
+                ', '.join(chunk.columns) + ') VALUES (' +
+                ', '.join('?' * len(chunk.columns)) + ')',
+                chunk.itertuples(index=False, name=None))
+            connection.commit()
+
+    # Sustitucion de las tablas
+    with connection:
+        for table in tables:
+            cursor.execute('DROP TABLE ' + table)
+            cursor.execute('ALTER TABLE ' + table + '_v2 RENAME TO ' + table)
+        cursor.execute('PRAGMA user_version=2')
+
+    if vacuum:
+        cursor.execute('VACUUM')
+    connection.close()
+    return True
+
+
+class DataBaseWriter(threading.Thread):
+
+    # Hilo escritor: recibe las filas por una cola acotada y las escribe en
+    # FileDataBase, de modo que la adquisicion nunca espera al disco. Si la
+    # cola esta llena la fila se descarta y se contabiliza. Si la base de
+    # datos esta bloqueada las filas se conservan y se reintenta cada
+    # retrydelay segundos; las filas que no se pueden escribir se descartan
+    # y se informa. Si el hilo termina por un error, put() lo notifica.
+    def __init__(self, filedb, maxsize=10000, buffersize=20, flushtime=10.0,
+                 retrydelay=1.0):
+        super().__init__(daemon=True)
+
+        self.filedb = filedb
+        self.buffersize = buffersize
+        self.flushtime = flushtime
+        self.retrydelay = retrydelay
+        self.queue = queue.Queue(maxsize)
+        self._stop_event = threading.Event()
+        # Error que ha terminado el hilo (None si sigue vivo o ha parado)
+        self.error = None
+
+        # Metricas de contrapresion
+        self.received = 0
+        self.dropped = 0
+        self.written = 0
+        self.rejected = 0
+        self.errors = 0
+        self.maxqueued = 0
+        self.maxwritetime = 0.0
+
+    @property
+    def failed(self):
+        # El hilo se ha arrancado y ha terminado sin que se pidiera parar
+        return self.error is not None or (self.ident is not None and
+                                          not self.is_alive() and
+                                          not self._stop_event.is_set())
+
+    def put(self, row):
+        # No bloqueante: se llama desde el hilo de adquisicion
+        if self.failed:
+            raise RuntimeError('El hilo escritor de ' + str(self.filedb) +
+                               ' ha terminado: ' + repr(self.error))
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped = self.dropped + 1
+            return False
+        self.received = self.received + 1
+        self.maxqueued = max(self.maxqueued, self.queue.qsize())
+        return True
+
+    def run(self):
+        try:
+            self.write_rows()
+        except Exception as error:
+            self.error = error
+            print('Error en el hilo escritor: ' + repr(error))
+
+    def connect(self):
+        # La conexion se crea en el propio hilo escritor. Si la base de
+        # datos esta bloqueada se reintenta hasta que se pida parar. El
+        # gestor de conexiones se suelta al terminar el hilo
+        manager = acquire_manager(self.filedb)
+        try:
+            while True:
+                try:
+                    return FileDataBase(self.filedb, self.buffersize,
+                                        self.flushtime, manager=manager)
+                except sqlite3.OperationalError as error:
+                    if (self._stop_event.is_set() or
+                            'locked' not in str(error)):
+                        raise
+                    self.errors = self.errors + 1
+                    print('Base de datos bloqueada, se reintentara: ' +
+                          repr(error))
+                    self._stop_event.wait(self.retrydelay)
+        except BaseException:
+            release_manager(manager)
+            raise
+
+    def write_rows(self):
+        db = self.connect()
+        try:
+            while True:
+                # Al parar solo se espera lo justo para vaciar la cola
+                timeout = 0.1 if self._stop_event.is_set() else \
+                    self.flushtime
+                try:
+                    row = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    row = None
+
+                tini = time.monotonic()
+                try:
+                    if row is None:
+                        # Sin datos: se escriben las filas pendientes
+                        db.flush()
+                        if self._stop_event.is_set() and self.queue.empty():
+                            break
+                    else:
+                        db.insert_data(*row)
+                except sqlite3.OperationalError as error:
+                    # Base de datos bloqueada u ocupada: las filas siguen
+                    # en el buffer de db (la nueva incluida) y se reintentan
+                    self.errors = self.errors + 1
+                    print('Error escribiendo en la base de datos, se '
+                          'reintentara: ' + repr(error))
+                    if self._stop_event.is_set() and self.queue.empty():
+                        print('Filas sin escribir al parar: ' +
+                              str(len(db.buffer)))
+                        db.buffer = []
+                        break
+                    self._stop_event.wait(self.retrydelay)
+                except (ValueError, TypeError) as error:
+                    # Fila con valores no validos: no llega al buffer
+                    self.errors = self.errors + 1
+                    self.rejected = self.rejected + 1
+                    print('Fila descartada: ' + repr(error))
+                except sqlite3.Error as error:
+                    # El bloque pendiente no se puede escribir: se escribe
+                    # fila a fila para descartar solo las no validas
+                    self.errors = self.errors + 1
+                    print('Error escribiendo el bloque: ' + repr(error))
+                    self.write_each(db)
+                # Solo cuentan como escritas las filas confirmadas
+                self.written = db.committed
+                self.maxwritetime = max(self.maxwritetime,
+                                        time.monotonic() - tini)
+        finally:
+            self.written = db.committed
+            db.buffer = []
+            db.close()
+            release_manager(db.manager)
+
+    def write_each(self, db):
+        rows = db.buffer
+        for n, row in enumerate(rows):
+            db.buffer = [row]
+            try:
+                db.flush()
+            except sqlite3.OperationalError:
+                db.buffer = rows[n:]
+                return
+            except sqlite3.Error as error:
+                self.rejected = self.rejected + 1
+                print('Fila descartada: ' + repr(error))
+        db.buffer = []
+
+    def stop(self, timeout=None):
+        # Vacia la cola, escribe lo pendiente y cierra la base de datos. No
+        # se bloquea si la cola esta llena o el hilo ya ha terminado.
+        # Devuelve True si el hilo ha terminado
+        self._stop_event.set()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if self.ident is not None:
+            self.join(timeout)
+        return not self.is_alive()
+
+    def stats(self):
+        return {'received': self.received,
+                'written': self.written,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+                'errors': self.errors,
+                'failed': self.failed,
+                'queued': self.queue.qsize(),
+                'maxqueued': self.maxqueued,
+                'maxwritetime': self.maxwritetime}
+
 
 # Ejemplo de código:
 # db = FileDataBase('swdata.db')
@@ -0,0 +1,236 @@
+import os
+import pty
+import time
+import tty
+import heapq
+import random
+import selectors
+import threading
+from datetime import datetime, timedelta, timezone
+from snowhite.swclient import PARSER_CONFIG
+
+
+class VirtualSnowWhite():
+
+    # Bomba snowwhite virtual sobre un pseudo-terminal. Contesta a cada
+    # "poll\r\n" con una trama de ancho fijo segun PARSER_CONFIG.
+    def __init__(self, latency=0.15, jitter=0.05, corruption=0.0,
+                 cycle_on=3600.0, cycle_off=0.0, flowrate=600.0,
+                 clock_offset=0.0, config=PARSER_CONFIG, seed=None):
+
+        self.latency = latency  # segundos
+        self.jitter = jitter  # segundos
+        self.corruption = corruption  # probabilidad por trama
+        self.cycle_on = cycle_on  # segundos con la bomba encendida
+        self.cycle_off = cycle_off  # segundos con la bomba apagada
+        self.flowrate = flowrate  # m3/h nominal
+        self.clock_offset = timedelta(seconds=clock_offset)
+        self.config = config
+        self.random = random.Random(seed)
+
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+
+        self.inbuffer = b''
+        self.started = self.now()
+        self.cyclestart = self.started
+        self.airvolume = 0.0
+        self.lastpoll = None
+
+        # Estadisticas
+        self.polls = 0
+        self.corrupted = 0
+
+    def now(self):
+        return (datetime.now(timezone.utc).replace(tzinfo=None) +
+                self.clock_offset)
+
+    def status(self, dt_now):
+        # Ciclos de encendido/apagado de la bomba
+        period = self.cycle_on + self.cycle_off
+        if self.cycle_off <= 0.0 or period <= 0.0:
+            return 1, self.started
+        elapsed = (dt_now - self.started).total_seconds()
+        cyclestart = self.started + timedelta(seconds=(elapsed // period) *
+                                              period)
+        if elapsed % period < self.cycle_on:
+            return 1, cyclestart
+        return 0, cyclestart
+
+    def values(self):
+        dt_now = self.now()
+        status, cyclestart = self.status(dt_now)
+
+        # Nuevo filtro: se reinicia el volumen acumulado
+        if cyclestart != self.cyclestart:
+            self.cyclestart = cyclestart
+            self.airvolume = 0.0
+
+        flowrate = 0.0
+        if status == 1:
+            flowrate = self.random.gauss(self.flowrate, self.flowrate * 0.01)
+            if self.lastpoll is not None:
+                elapsed = (dt_now - self.lastpoll).total_seconds()
+                self.airvolume = self.airvolume + flowrate * elapsed / 3600.0
+        self.lastpoll = dt_now
+
+        return {
+            'startdatetime': cyclestart,
+            'duration': dt_now - cyclestart,
+            'status': status,
+            'Pdiff': self.random.gauss(15.0, 0.5) * status,
+            'flowrate': flowrate,
+            'airvolume': self.airvolume,
+            'temperatureafilter': self.random.gauss(22.0, 0.2),
+            'Pafilter': self.random.gauss(990.0, 1.0),
+            'temperature': self.random.gauss(20.0, 0.2),
+            'winddir': self.random.randint(0, 359),
+            'windspeed': abs(self.random.gauss(3.0, 1.0)),
+            'pressure': self.random.gauss(1013.0, 1.0),
+            'humidity': self.random.uniform(30.0, 90.0),
+            'rainfall': 0.0,
+            'tamper_1': 0,
+            'tamper_2': 0,
+            'actualdatetime': dt_now,
+            'unknown0': 0.0,
+            'unknown1': 0,
+            'unknown2': 0.0
+        }
+
+    @staticmethod
+    def formatvalue(value, fieldtype, width):
+        if fieldtype == 'datetime':
+            text = value.strftime('%d/%m/%Y %H:%M:%S')
+        elif fieldtype == 'timedelta':
+            seconds = int(value.total_seconds())
+            text = '%02d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60,
+                                       seconds % 60)
+        elif fieldtype == 'int':
+            text = '%d' % value
+        else:
+            # Tantos decimales como quepan en el ancho del campo
+            for decimals in (2, 1, 0):
+                text = '%.*f' % (decimals, value)
+                if len(text) <= width:
+                    break
+        return text[-width:].rjust(width)
+
+    def frame(self):
+        inichar, endchar = self.config['delimiters']
+        parameters = self.config['parameters']
+        values = self.values()
+
+        width = max(parameters[name]['position'][1] for name in parameters)
+        body = [' '] * width
+        for name in parameters:
+            ini, fin = parameters[name]['position']
+            body[ini:fin] = self.formatvalue(values[name],
+                                             parameters[name]['type'],
+                                             fin - ini)
+
+        frame = (inichar + ''.join(body) + endchar + '\r\n').encode()
+        if self.random.random() < self.corruption:
+            frame = self.corrupt(frame)
+        return frame
+
+    def corrupt(self, frame):
+        # Ruido en la linea: bytes cambiados, basura o trama truncada
+        self.corrupted = self.corrupted + 1
+        frame = bytearray(frame)
+        kind = self.random.randrange(3)
+        if kind == 0:
+            for _ in range(self.random.randint(1, 3)):
+                frame[self.random.randrange(len(frame))] = \
+                    self.random.randrange(32, 127)
+        elif kind == 1:
+            garbage = bytes(self.random.randrange(256)
+                            for _ in range(self.random.randint(1, 8)))
+            frame = garbage + frame
+        else:
+            frame = frame[:self.random.randrange(1, len(frame))]
+        return bytes(frame)
+
+    def delay(self):
+        return max(0.0, self.latency + self.random.uniform(-self.jitter,
+                                                           self.jitter))
+
+    def receive(self):
+        # Lee lo recibido y devuelve el numero de consultas completas
+        try:
+            self.inbuffer = self.inbuffer + os.read(self.master, 1024)
+        except (BlockingIOError, OSError):
+            return 0
+        npolls = self.inbuffer.count(b'poll\r\n')
+        self.inbuffer = self.inbuffer.rsplit(b'poll\r\n', 1)[-1]
+        self.polls = self.polls + npolls
+        return npolls
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class SnowWhiteEmulator():
+
+    # Atiende muchas bombas virtuales desde un unico hilo con un selector.
+    # Las respuestas se programan en una cola segun la latencia de cada una.
+    def __init__(self, ndevices=1, seed=None, **kwargs):
+
+        self.devices = [
+            VirtualSnowWhite(seed=None if seed is None else seed + n, **kwargs)
+            for n in range(ndevices)
+        ]
+        self.selector = selectors.DefaultSelector()
+        for device in self.devices:
+            self.selector.register(device.master, selectors.EVENT_READ,
+                                   device)
+
+        self.pending = []
+        self.counter = 0
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    @property
+    def ports(self):
+        return [device.port for device in self.devices]
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        while not self.finished.is_set():
+            timeout = 0.05
+            if self.pending:
+                timeout = min(timeout,
+                              max(0.0, self.pending[0][0] - time.monotonic()))
+
+            for key, _ in self.selector.select(timeout):
+                device = key.data
+                for _ in range(device.receive()):
+                    self.counter = self.counter + 1
+                    heapq.heappush(self.pending,
+                                   (time.monotonic() + device.delay(),
+                                    self.counter, device))
+
+            # Enviamos las respuestas cuyo retardo ha vencido
+            while self.pending and self.pending[0][0] <= time.monotonic():
+                _, _, device = heapq.heappop(self.pending)
+                try:
+                    os.write(device.master, device.frame())
+                except OSError:
+                    pass
+
+    def stop(self):
+        self.finished.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.selector.close()
+        for device in self.devices:
+            device.close()
+
+    def stats(self):
+        return [{'port': device.port,
+                 'polls': device.polls,
+                 'corrupted': device.corrupted} for device in self.devices]
@@ -0,0 +1,212 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import pandas as pd
+from snowhite.dbdump import (FileDataBase, series_to_epoch_ms,
+                             series_to_seconds)
+from snowwhite.libs.journal import JsonJournal
+
+# Ficheros de la aplicacion de escritorio (SnowWhiteData) y tabla de destino.
+# Los ficheros estan guardados con to_json(orient='table'); en modo diario
+# cada uno puede tener al lado un diario JSON Lines (.jsonl) con las filas
+# aun no compactadas, que tambien se importa
+JSON_FILES = [
+    ('snowwhite_ultimahora', 'Valores_Tiempo_Real'),
+    ('snowwhite_datoshorarios_*', 'Valores_Horarios'),
+    ('filtros_*', 'Valores_Filtro')
+]
+
+# Clave de las filas de cada fichero (en el diario vale la ultima)
+KEYS = {
+    'Valores_Tiempo_Real': 'actualdatetime',
+    'Valores_Horarios': 'time',
+    'Valores_Filtro': 'measuretime'
+}
+
+COLUMNS = {
+    'Valores_Tiempo_Real': ['FECHA', 'FECHA_MEDIDA', 'DURACION', 'ACTIVO',
+                            'DIFPRESION', 'CAUDAL', 'VOLUMEN_INC',
+                            'VOLUMEN_CUM'],
+    'Valores_Horarios': ['FECHA', 'CAUDAL', 'VOLUMEN'],
+    'Valores_Filtro': ['FECHA_MEDIDA', 'DURACION', 'CAUDAL', 'VOLUMEN']
+}
+
+# Los datos de tiempo real ya guardados tienen prioridad; de los valores
+# horarios y de los filtros se queda el fichero mas reciente, que es el
+# mas completo
+CONFLICT = {
+    'Valores_Tiempo_Real': 'INSERT OR IGNORE',
+    'Valores_Horarios': 'INSERT OR REPLACE',
+    'Valores_Filtro': 'INSERT OR REPLACE'
+}
+
+
+def json_files(folder):
+    # Ficheros de salida bajo folder (incluidas las carpetas por año) en
+    # orden cronologico por nombre
+    files = []
+    for pattern, table in JSON_FILES:
+        paths = set(path.with_suffix('.json')
+                    for suffix in ('.json', '.jsonl')
+                    for path in Path(folder).rglob(pattern + suffix))
+        files.extend((path, table) for path in sorted(paths))
+    return files
+
+
+def duration_values(values):
+    # Duraciones como timedelta. Con la configuracion de escritorio la
+    # duracion se lee como fecha (tipo 'datetime'): se toma su hora del dia
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values - values.dt.normalize()
+    return pd.to_timedelta(values)
+
+
+def realtime_values(values):
+    # swdata: una fila por trama con los nombres de campo del parser
+    values = values.sort_values('actualdatetime')
+    interval = values.actualdatetime.diff().dt.total_seconds().fillna(1.0)
+    previous = values.flowrate.shift().fillna(values.flowrate)
+    # Volumen por la regla del trapecio, como en SnowWhiteDataCollect
+    return pd.DataFrame({
+        'FECHA': values.actualdatetime,
+        'FECHA_MEDIDA': values.startdatetime,
+        'DURACION': duration_values(values.duration),
+        'ACTIVO': values.status,
+        'DIFPRESION': values.Pdiff,
+        'CAUDAL': values.flowrate,
+        'VOLUMEN_INC': interval * (values.flowrate + previous) / 7200.0,
+        'VOLUMEN_CUM': values.airvolume
+    })
+
+
+def hourly_values(values):
+    # statdata: la hora se etiqueta con su final ('time')
+    return pd.DataFrame({'FECHA': values.time,
+                         'CAUDAL': values.flowrate_mean,
+                         'VOLUMEN': values.volume})
+
+
+def sample_values(values):
+    # sampledata: la duracion esta en segundos
+    return pd.DataFrame({
+        'FECHA_MEDIDA': values.measuretime,
+        'DURACION': pd.to_timedelta(values.duration, unit='s'),
+        'CAUDAL': values.flowrate,
+        'VOLUMEN': values.volume
+    })
+
+
+CONVERTERS = {
+    'Valores_Tiempo_Real': realtime_values,
+    'Valores_Horarios': hourly_values,
+    'Valores_Filtro': sample_values
+}
+
+
+def read_output(path, table):
+    # Contenido del fichero JSON mas el de su diario, leidos con el mismo
+    # JsonJournal que los escribe
+    values = JsonJournal(path, KEYS[table]).load()
+    if values is None:
+        return pd.DataFrame()
+    return values
+
+
+def read_json_rows(path, table, version):
+    # Lee un fichero (y su diario) y devuelve sus filas ya codificadas para
+    # el esquema de la base de datos. Se ejecuta en los procesos de lectura
+    values = read_output(path, table)
+    if values.empty:
+        return []
+    values = CONVERTERS[table](values.reset_index(drop=True))
+
+    for column in values.columns:
+        if column in ('FECHA', 'FECHA_MEDIDA'):
+            if version >= 2:
+                values[column] = series_to_epoch_ms(
+                    values[column]).astype('Int64')
+            else:
+                values[column] = pd.to_datetime(
+                    values[column]).dt.strftime('%Y-%m-%d %H:%M:%S')
+        elif column == 'DURACION':
+            if version >= 2:
+                values[column] = series_to_seconds(
+                    values[column]).astype('Int64')
+            else:
+                values[column] = pd.to_timedelta(values[column]).astype(str)
+
+    values = values.dropna(subset=[COLUMNS[table][0]])
+    values = values.astype(object).where(values.notna(), None)
+    return list(values.itertuples(index=False, name=None))
+
+
+def update_marks(db, tables):
+    # Adelanta las marcas de Ultimos_Valores hasta el ultimo dato importado
+    # para que la agregacion horaria continue desde ahi
+    for table in ('Valores_Tiempo_Real', 'Valores_Horarios'):
+        if table not in tables:
+            continue
+        db.cursor.execute('''
+        UPDATE Ultimos_Valores SET FECHA=(SELECT MAX(FECHA) FROM ''' + table +
+                          ''')
+        WHERE TIPO=? AND (FECHA IS NULL OR FECHA='' OR
+        FECHA < (SELECT MAX(FECHA) FROM ''' + table + '''))
+        ''', (table,))
+
+
+def import_json(filedb, folder, workers=None, batchsize=100000):
+    # Importa las salidas JSON de la aplicacion de escritorio en la base de
+    # datos. Los ficheros se leen en paralelo en workers procesos (como
+    # mucho 2 * workers en curso, para acotar la memoria) y se escriben en
+    # orden con executemany, confirmando la transaccion cada batchsize
+    # filas. Un fichero que no se puede leer se informa y se salta.
+    # Devuelve el numero de filas leidas por tabla
+    db = FileDataBase(filedb)
+    db.cursor.execute('PRAGMA journal_mode=WAL')
+    db.cursor.execute('PRAGMA synchronous=NORMAL')
+
+    files = json_files(folder)
+    counts = {table: 0 for table in COLUMNS}
+    pending = 0
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    with ProcessPoolExecutor(workers) as executor:
+        futures = deque()
+        remaining = iter(files)
+
+        def submit():
+            item = next(remaining, None)
+            if item is not None:
+                futures.append((item[0], item[1], executor.submit(
+                    read_json_rows, item[0], item[1], db.version)))
+
+        for _ in range(2 * workers):
+            submit()
+
+        while futures:
+            path, table, future = futures.popleft()
+            try:
+                rows = future.result()
+            except Exception as error:
+                print('Error leyendo ' + str(path) + ': ' + repr(error))
+                rows = []
+            submit()
+
+            columns = COLUMNS[table]
+            db.cursor.executemany(
+                CONFLICT[table] + ' INTO ' + table + ' (' +
+                ', '.join(columns) + ') VALUES (' +
+                ', '.join('?' * len(columns)) + ')', rows)
+            counts[table] = counts[table] + len(rows)
+            pending = pending + len(rows)
+            if pending >= batchsize:
+                db.connection.commit()
+                pending = 0
+
+    update_marks(db, [table for table in counts if counts[table] > 0])
+    db.connection.commit()
+    db.close()
+    return counts
@@ -1,5 +1,15 @@
+import re
+import warnings
+import numpy as np
 import pandas as pd
-from io import StringIO
+from itertools import islice
+from collections import namedtuple
+from datetime import datetime
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:
+    # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
 
 
 # Funciones de conversión
@@ -24,14 +34,180 @@ def convert_to_timedelta(x):
         return None
 
 
+def convert_to_datetime(x):
+    try:
+        return pd.Timestamp(x)
+    except ValueError:
+        return None
+
+
 # Diccionario con las funciones de conversión
 CONVERTER = {
     'int': convert_to_int,
     'float': convert_to_float,
-    'timedelta': convert_to_timedelta
+    'timedelta': convert_to_timedelta,
+    'datetime': convert_to_datetime
 }
 
 
+def parse_dayfirst(x):
+    # Las fechas de la bomba llevan el dia primero (05/03/2024 es el 5 de
+    # marzo)
+    try:
+        return pd.to_datetime(x, dayfirst=True)
+    except (ValueError, TypeError):
+        return None
+
+
+def compile_converter(fieldtype, dtformat=None):
+    # Conversor del parser compilado. Para las fechas se usa el formato de
+    # la configuracion ('format') o, si no hay, se deduce con el primer
+    # valor (con el dia primero) y se reutiliza con strptime, mucho mas
+    # rapido que dejar que pandas lo infiera en cada muestra. Si el formato
+    # no sirve para un valor se deduce de nuevo para ese valor
+    if fieldtype != 'datetime':
+        return CONVERTER[fieldtype]
+
+    # El formato configurado no cambia nunca; el deducido se sustituye si
+    # deja de servir
+    guessedformat = [None]
+
+    def converter(x):
+        currentformat = dtformat or guessedformat[0]
+        if currentformat is None:
+            currentformat = guessedformat[0] = guess_datetime_format(
+                x, dayfirst=True)
+        if currentformat is not None:
+            try:
+                return pd.Timestamp(datetime.strptime(x, currentformat))
+            except ValueError:
+                pass
+        guessed = guess_datetime_format(x, dayfirst=True)
+        if guessed is not None and guessed != currentformat:
+            try:
+                value = pd.Timestamp(datetime.strptime(x, guessed))
+                if dtformat is None:
+                    guessedformat[0] = guessed
+                return value
+            except ValueError:
+                pass
+        return parse_dayfirst(x)
+
+    return converter
+
+
+def bytes_to_float(x):
+    # float() acepta bytes y memoryview sin decodificar a str
+    try:
+        return float(x)
+    except ValueError:
+        return None
+
+
+def bytes_to_timedelta(x):
+    try:
+        hours, minutes, seconds = bytes(x).split(b':')
+        return pd.Timedelta(int(hours) * 3600 + int(minutes) * 60 +
+                            int(seconds), 's')
+    except ValueError:
+        return convert_to_timedelta(bytes(x).decode('ascii', 'replace'))
+
+
+def compile_bytes_converter(fieldtype, dtformat=None):
+    # Conversor del parser de bytes: solo las fechas se decodifican a str
+    if fieldtype in ('int', 'float'):
+        return bytes_to_float
+    if fieldtype == 'timedelta':
+        return bytes_to_timedelta
+
+    converter = compile_converter(fieldtype, dtformat)
+
+    def decode(x):
+        return converter(bytes(x).decode('ascii', 'replace').strip())
+
+    return decode
+
+
+def batch_timedelta(matrix):
+    # Duraciones 'H:MM:SS' alineadas a la derecha: se calculan directamente
+    # a partir de los digitos de la matriz de bytes. Las filas que no
+    # cumplen el formato se dejan para pd.to_timedelta
+    digits = matrix.astype(np.int64) - ord('0')
+    isdigit = (digits >= 0) & (digits <= 9)
+    hourdigits = np.where(isdigit[:, :-6], digits[:, :-6], 0)
+    valid = ((matrix[:, -3] == ord(':')) & (matrix[:, -6] == ord(':')) &
+             isdigit[:, [-8, -7, -5, -4, -2, -1]].all(axis=1) &
+             (isdigit[:, :-6] | (matrix[:, :-6] == ord(' '))).all(axis=1))
+
+    hours = (hourdigits * 10**np.arange(hourdigits.shape[1] - 1, -1,
+                                        -1)).sum(axis=1)
+    seconds = (hours * 3600 +
+               (digits[:, -5] * 10 + digits[:, -4]) * 60 +
+               digits[:, -2] * 10 + digits[:, -1])
+    values = seconds.astype('timedelta64[s]')
+
+    if not valid.all():
+        text = np.char.strip(matrix[~valid].copy().view(
+            'S%d' % matrix.shape[1]).ravel().astype('U'))
+        values[~valid] = pd.to_timedelta(
+            text, errors='coerce').to_numpy().astype('timedelta64[s]')
+    return values
+
+
+def batch_convert(matrix, fieldtype, dtformat=None):
+    # Conversion vectorizada de una columna de la matriz de bytes
+    if fieldtype == 'timedelta' and matrix.shape[1] >= 8:
+        return batch_timedelta(matrix)
+
+    column = matrix.view('S%d' % matrix.shape[1]).ravel()
+
+    if fieldtype == 'timedelta':
+        text = np.char.strip(column.astype('U'))
+        return pd.to_timedelta(text, errors='coerce').to_numpy()
+
+    if fieldtype == 'datetime':
+        text = np.char.strip(column.astype('U'))
+        nonempty = text != ''
+        if not nonempty.any():
+            return pd.to_datetime(text, errors='coerce').to_numpy()
+        # Formato de la configuracion o, si no hay o deja valores no
+        # validos, el deducido de la primera fecha con el dia primero (un
+        # bloque en el que todos los dias son <= 12 no permite distinguir
+        # dia y mes)
+        guessed = guess_datetime_format(str(text[nonempty][0]),
+                                        dayfirst=True)
+        values = None
+        for candidateformat in (dtformat, guessed):
+            if candidateformat is None:
+                continue
+            try:
+                candidate = pd.to_datetime(text, format=candidateformat,
+                                           errors='coerce').to_numpy()
+            except ValueError:
+                # Formato no valido
+                continue
+            invalid = (np.isnat(candidate) & nonempty).sum()
+            if values is None or invalid < invalid_values:
+                values, invalid_values = candidate, invalid
+            if invalid_values == 0:
+                break
+        if values is None:
+            # Sin formato comun: pandas avisa de que interpreta cada valor
+            # por separado, que es justo lo que se quiere aqui
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                values = pd.to_datetime(text, dayfirst=True,
+                                        errors='coerce').to_numpy()
+        return values
+
+    try:
+        return column.astype(np.float64)
+    except ValueError:
+        # Hay campos vacios o no numericos: se convierten a NaN
+        return pd.to_numeric(np.char.strip(column.astype('U')),
+                             errors='coerce').astype(np.float64)
+
+
 class ParserFixedWidth():
 
     def __init__(self, config):
@@ -42,6 +218,8 @@ class ParserFixedWidth():
 
         self.names = []
         self.positions = []
+        self.types = {}
+        self.formats = {}
         self.converters = {}
         self.parse_dates = []
         self.parse_timedeltas = []
@@ -50,6 +228,8 @@ class ParserFixedWidth():
         for name in parameters:
             self.names.append(name)
             self.positions.append(tuple(parameters[name]['position']))
+            self.types[name] = parameters[name]['type']
+            self.formats[name] = parameters[name].get('format')
 
             if parameters[name]['type'] == 'datetime':
                 self.parse_dates.append(name)
@@ -57,14 +237,98 @@ class ParserFixedWidth():
 
             self.converters[name] = CONVERTER[parameters[name]['type']]
 
-    def lineparser(self, linedata):
-        strdata = StringIO(linedata[linedata.find(self.inichar) +
-                                    1:linedata.find(self.endchar)])
-        values = pd.read_fwf(strdata,
-                             index_col=False,
-                             names=self.names,
-                             colspecs=self.positions,
-                             converters=self.converters,
-                             parse_dates=self.parse_dates)
+        # Parser compilado: los offsets de cada campo y su funcion de
+        # conversion se calculan una unica vez
+        self.record = namedtuple('SnowWhiteRecord', self.names)
+        self.fields = [(slice(*self.positions[i]),
+                        compile_converter(self.types[name],
+                                          self.formats[name]))
+                       for i, name in enumerate(self.names)]
+        self.bytefields = [(slice(*self.positions[i]),
+                            compile_bytes_converter(self.types[name],
+                                                    self.formats[name]))
+                           for i, name in enumerate(self.names)]
+        self.inipattern = re.compile(re.escape(self.inichar.encode()))
+        self.endpattern = re.compile(re.escape(self.endchar.encode()))
+
+    def recordparser(self, linedata):
+        # Devuelve un registro ligero (namedtuple) sin pasar por pandas
+        strdata = linedata[linedata.find(self.inichar) +
+                           1:linedata.find(self.endchar)]
+        return self.record._make([converter(strdata[field].strip())
+                                  for field, converter in self.fields])
+
+    def bytesparser(self, buffer):
+        # Igual que recordparser pero sobre bytes/bytearray/memoryview tal
+        # cual llegan del puerto serie: los delimitadores se buscan y los
+        # campos se cortan sobre el buffer sin crear la cadena str completa
+        view = memoryview(buffer)
+        inimatch = self.inipattern.search(view)
+        endmatch = self.endpattern.search(view)
+        ini = inimatch.start() if inimatch else -1
+        fin = endmatch.start() if endmatch else -1
+        bytedata = view[ini + 1:fin]
+        return self.record._make([converter(bytedata[field])
+                                  for field, converter in self.bytefields])
+
+    def todataframe(self, records):
+        # Convierte uno o varios registros en un DataFrame
+        if isinstance(records, self.record):
+            records = [records]
+        return pd.DataFrame.from_records(records, columns=self.names)
+
+    def batchparser(self, frames, dataframe=False):
+        # Parseo vectorizado de una lista de tramas (str o bytes). Devuelve
+        # un diccionario con un array NumPy por campo o un DataFrame
+        frames = list(frames)
+        if frames and isinstance(frames[0], str):
+            frames = '\0'.join(frames).encode('latin-1',
+                                               'replace').split(b'\0')
 
+        inichar = self.inichar.encode()
+        endchar = self.endchar.encode()
+        bodies = [frame[frame.find(inichar) + 1:frame.find(endchar)]
+                  for frame in frames]
+
+        # Matriz de bytes (una fila por trama) de la que se cortan los
+        # campos por columnas
+        width = max(position[1] for position in self.positions)
+        matrix = np.array(bodies, dtype='S%d' % width)
+        matrix = matrix.view(np.uint8).reshape(len(bodies), width)
+
+        values = {}
+        for name, (ini, fin) in zip(self.names, self.positions):
+            column = np.ascontiguousarray(matrix[:, ini:fin])
+            values[name] = batch_convert(column, self.types[name],
+                                         self.formats[name])
+
+        if dataframe:
+            return pd.DataFrame(values, columns=self.names)
         return values
+
+    def iterfileparser(self, filename, chunksize=1000000, dataframe=False):
+        # Parsea un fichero de tramas por bloques de chunksize lineas para
+        # mantener acotada la memoria
+        with open(filename, 'rb') as framesfile:
+            while True:
+                frames = list(islice(framesfile, chunksize))
+                if not frames:
+                    break
+                yield self.batchparser(frames, dataframe)
+
+    def fileparser(self, filename, chunksize=1000000, dataframe=False):
+        # Parsea un fichero de tramas completo
+        chunks = list(self.iterfileparser(filename, chunksize, dataframe))
+        if dataframe:
+            if not chunks:
+                return self.batchparser([], dataframe=True)
+            return pd.concat(chunks, ignore_index=True)
+        if not chunks:
+            return self.batchparser([])
+        return {name: np.concatenate([chunk[name] for chunk in chunks])
+                for name in self.names}
+
+    def lineparser(self, linedata):
+        # DataFrame de una fila con las mismas conversiones (y el mismo
+        # criterio de fechas, dia primero) que recordparser
+        return self.todataframe(self.recordparser(linedata))
@@ -0,0 +1,233 @@
+import pandas as pd
+import numpy as np
+from snowhite.dbdump import FileDataBase, ROLLUP_TABLE
+
+# Resoluciones de los agregados: tabla (tambien su marca en
+# Ultimos_Valores), tamaño del intervalo y, para el esquema de fechas TEXT,
+# formato del inicio del intervalo y modificador de SQLite del tamaño
+ROLLUPS = {
+    'minuto': ('Rollup_Minuto', pd.Timedelta(minutes=1), '%Y-%m-%d %H:%M:00',
+               '1 minute'),
+    'hora': ('Rollup_Hora', pd.Timedelta(hours=1), '%Y-%m-%d %H:00:00',
+             '1 hour'),
+    'dia': ('Rollup_Dia', pd.Timedelta(days=1), '%Y-%m-%d 00:00:00',
+            '1 day')
+}
+
+# Cada nivel se calcula a partir del anterior
+CASCADE = [('minuto', None), ('hora', 'minuto'), ('dia', 'hora')]
+
+
+class SnowWhiteRollups():
+
+    # Agregados incrementales del caudal por minuto, hora y dia (n, suma,
+    # suma de cuadrados, minimo, maximo y volumen integrado) y retencion de
+    # los datos de tiempo real. Se siguen los criterios de Valores_Horarios:
+    # el intervalo [inicio, fin) se etiqueta con su final y el volumen de
+    # cada muestra es el caudal por el tiempo desde la anterior
+    # (FileDataBase.volume_query), asi Rollup_Hora coincide con
+    # Valores_Horarios. Los agregados son sumables, por eso cada nivel se
+    # obtiene del anterior sin volver a leer los datos de tiempo real.
+    def __init__(self, filedb, retention_days=30, archive_folder=None,
+                 maxgap=None):
+
+        self.filedb = filedb
+        self.retention = pd.Timedelta(days=retention_days)
+        self.archive_folder = archive_folder
+        # Con maxgap los intervalos entre muestras mayores que maxgap
+        # segundos (cortes) no suman volumen. Por defecto, como en
+        # Valores_Horarios, todos suman
+        self.maxgap = maxgap
+
+    def create_tables(self, db):
+        timetype = 'INTEGER' if db.version >= 2 else 'TEXT'
+        for resolution in ROLLUPS:
+            table = ROLLUPS[resolution][0]
+            db.cursor.execute('CREATE TABLE IF NOT EXISTS ' + table + ' ' +
+                              ROLLUP_TABLE.format(timetype=timetype))
+            db.cursor.execute('''
+            INSERT OR IGNORE INTO Ultimos_Valores (TIPO, FECHA)
+            VALUES (?, NULL)
+            ''', (table,))
+        db.connection.commit()
+
+    @staticmethod
+    def bucket(db, resolution, source=None):
+        # Expresion SQL con el final del intervalo de cada fila. Las filas
+        # de un nivel anterior (etiquetadas con su final) se asignan por su
+        # inicio
+        table, step, dtformat, modifier = ROLLUPS[resolution]
+        if db.version >= 2:
+            size = str(int(step.total_seconds() * 1000))
+            value = 'FECHA'
+            if source is not None:
+                value = ('(FECHA - ' +
+                         str(int(ROLLUPS[source][1].total_seconds() * 1000))
+                         + ')')
+            return '(' + value + ' / ' + size + ' + 1) * ' + size
+        modifiers = "'+" + modifier + "'"
+        if source is not None:
+            modifiers = "'-" + ROLLUPS[source][3] + "', " + modifiers
+        return "strftime('" + dtformat + "', FECHA, " + modifiers + ")"
+
+    @staticmethod
+    def mark(db, table):
+        value = db.cursor.execute(
+            'SELECT FECHA FROM Ultimos_Valores WHERE TIPO=?',
+            (table,)).fetchone()
+        if value is None or value[0] == '':
+            return pd.NaT
+        return db.decode_time(pd.Series([value[0]])).iloc[0]
+
+    def update_level(self, db, resolution, source, limit):
+        # Agrega el nivel hasta el ultimo intervalo cerrado antes de limit.
+        # La marca es el final del ultimo intervalo agregado
+        table, step = ROLLUPS[resolution][:2]
+        start = self.mark(db, table)
+        end = limit.floor(step)
+        if not pd.isna(start) and start >= end:
+            return end
+
+        params = {'start': None if pd.isna(start) else db.encode_time(start),
+                  'end': db.encode_time(end)}
+
+        if source is None:
+            # Desde tiempo real: muestras en [start, end)
+            where = 'FECHA < :end'
+            if not pd.isna(start):
+                where = 'FECHA >= :start AND ' + where
+            query = db.volume_query(not pd.isna(start), self.maxgap) + '''
+            INSERT INTO ''' + table + '''
+            (FECHA, N, SUMA, SUMSQ, MINIMO, MAXIMO, VOLUMEN)
+            SELECT ''' + self.bucket(db, resolution) + ''' AS FIN,
+            COUNT(CAUDAL), SUM(CAUDAL), SUM(CAUDAL * CAUDAL),
+            MIN(CAUDAL), MAX(CAUDAL), TOTAL(VOLUMEN)
+            FROM tiempo_real
+            WHERE ''' + where + '''
+            GROUP BY FIN
+            '''
+        else:
+            # Desde el nivel anterior: intervalos con final en (start, end]
+            where = 'FECHA <= :end'
+            if not pd.isna(start):
+                where = 'FECHA > :start AND ' + where
+            query = '''
+            INSERT INTO ''' + table + '''
+            (FECHA, N, SUMA, SUMSQ, MINIMO, MAXIMO, VOLUMEN)
+            SELECT ''' + self.bucket(db, resolution, source) + ''' AS FIN,
+            SUM(N), SUM(SUMA), SUM(SUMSQ), MIN(MINIMO), MAX(MAXIMO),
+            SUM(VOLUMEN)
+            FROM ''' + ROLLUPS[source][0] + '''
+            WHERE ''' + where + '''
+            GROUP BY FIN
+            '''
+
+        # Cada fila de origen se agrega una sola vez (marca), asi que si el
+        # intervalo ya existe se suman los nuevos valores
+        query = query + '''
+            ON CONFLICT(FECHA) DO UPDATE SET
+            N=N + excluded.N, SUMA=SUMA + excluded.SUMA,
+            SUMSQ=SUMSQ + excluded.SUMSQ,
+            MINIMO=MIN(MINIMO, excluded.MINIMO),
+            MAXIMO=MAX(MAXIMO, excluded.MAXIMO),
+            VOLUMEN=VOLUMEN + excluded.VOLUMEN
+            '''
+
+        with db.connection:
+            db.cursor.execute(query, params)
+            db.cursor.execute('''
+            UPDATE Ultimos_Valores SET FECHA=? WHERE TIPO=?
+            ''', (params['end'], table))
+        return end
+
+    def update(self):
+        # Actualiza minuto -> hora -> dia y aplica la retencion
+        db = FileDataBase(self.filedb)
+        self.create_tables(db)
+
+        limit = self.mark(db, 'Valores_Tiempo_Real')
+        if pd.isna(limit):
+            db.close()
+            return None
+
+        marks = {}
+        for resolution, source in CASCADE:
+            marks[resolution] = self.update_level(db, resolution, source,
+                                                  limit)
+            limit = marks[resolution]
+        db.close()
+
+        self.purge(marks['minuto'])
+        return marks
+
+    def purge(self, rolledup):
+        # Borra los datos de tiempo real mas antiguos que la ventana de
+        # retencion, solo si ya estan agregados, ya los ha consumido el
+        # calculo de Valores_Horarios (y archivados si procede)
+        db = FileDataBase(self.filedb, readonly=True)
+        hourly = self.mark(db, 'Valores_Horarios')
+        cutoff = min(self.mark(db, 'Valores_Tiempo_Real') - self.retention,
+                     rolledup)
+        db.close()
+        if pd.isna(hourly):
+            return 0
+        cutoff = min(cutoff, hourly)
+
+        if self.archive_folder is not None:
+            # Import local: el archivo necesita pyarrow, que es opcional
+            from snowhite.archive import archive_days, ARCHIVE_MARK
+            archive_days(self.filedb, self.archive_folder)
+            db = FileDataBase(self.filedb, readonly=True)
+            archived = self.mark(db, ARCHIVE_MARK)
+            db.close()
+            if pd.isna(archived):
+                return 0
+            cutoff = min(cutoff, archived)
+
+        # Se conserva la ultima muestra anterior al corte: el siguiente
+        # calculo la necesita para el volumen del primer intervalo
+        db = FileDataBase(self.filedb)
+        with db.connection:
+            db.cursor.execute('''
+            DELETE FROM Valores_Tiempo_Real WHERE FECHA < (
+                SELECT MAX(FECHA) FROM Valores_Tiempo_Real WHERE FECHA < ?)
+            ''', (db.encode_time(cutoff),))
+            deleted = db.cursor.rowcount
+        db.close()
+        return deleted
+
+    def get_rollup(self, resolution='hora', start=None, end=None):
+        # Agregados de una resolucion con media y desviacion tipica. FECHA
+        # es el final del intervalo: start y end filtran por esa etiqueta
+        table = ROLLUPS[resolution][0]
+        db = FileDataBase(self.filedb, readonly=True)
+        exists = db.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+            (table,)).fetchone()
+        if exists is None:
+            # Todavia no se ha ejecutado update()
+            db.close()
+            return pd.DataFrame(columns=['FECHA', 'N', 'SUMA', 'SUMSQ',
+                                         'MINIMO', 'MAXIMO', 'VOLUMEN',
+                                         'MEDIA', 'DESVIACION'])
+
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append('FECHA >= ?')
+            params.append(db.encode_time(pd.Timestamp(start)))
+        if end is not None:
+            conditions.append('FECHA < ?')
+            params.append(db.encode_time(pd.Timestamp(end)))
+        query = 'SELECT * FROM ' + table
+        if conditions:
+            query = query + ' WHERE ' + ' AND '.join(conditions)
+
+        values = db.get_dataframe(query + ' ORDER BY FECHA', params)
+        values['FECHA'] = db.decode_time(values['FECHA'])
+        db.close()
+
+        values['MEDIA'] = values.SUMA / values.N
+        values['DESVIACION'] = np.sqrt(np.maximum(
+            values.SUMSQ / values.N - values.MEDIA**2, 0.0))
+        return values
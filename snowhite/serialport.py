@@ -1,7 +1,69 @@
 from serial import Serial, SerialException
+import asyncio
 import io
 
 
+class FrameBuffer():
+
+    # Buffer de bytes reutilizable del que se extraen tramas completas
+    # inichar...endchar. Los restos de tramas incompletas se conservan
+    # para la siguiente lectura y la basura se descarta.
+    def __init__(self, inichar, endchar, size=4096):
+        self.inichar = inichar
+        self.endchar = endchar
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def compact(self):
+        # Mueve los bytes pendientes al principio del buffer
+        pending = self.end - self.start
+        self.buffer[:pending] = self.view[self.start:self.end]
+        self.start = 0
+        self.end = pending
+
+    def feed(self, data):
+        size = len(self.buffer)
+        if len(data) > size - self.end:
+            self.compact()
+        if len(data) > size - self.end:
+            # Buffer lleno sin tramas validas: se conservan los ultimos bytes
+            data = bytes(self.view[self.start:self.end]) + data
+            data = data[-size:]
+            self.start = 0
+            self.end = 0
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end = self.end + len(data)
+
+    def clear(self):
+        self.start = self.end = 0
+
+    def extract(self):
+        ini = self.buffer.find(self.inichar, self.start, self.end)
+        if ini < 0:
+            # Ningun inicio de trama: todo lo pendiente es basura
+            self.start = self.end = 0
+            return None
+        self.start = ini
+
+        fin = self.buffer.find(self.endchar, ini + 1, self.end)
+        if fin < 0:
+            return None
+
+        # Si hay otro inicio antes del fin, la trama anterior esta rota y
+        # se resincroniza con el ultimo inicio
+        ini = self.buffer.rfind(self.inichar, ini, fin)
+        frame = bytes(self.view[ini:fin + 1])
+        self.start = fin + 1
+        if self.start == self.end:
+            self.start = self.end = 0
+        return frame
+
+
 class SerialPort(Serial):
 
     # iniciamos la clase: Esto será en un archivo aparte
@@ -10,9 +72,18 @@ class SerialPort(Serial):
         super().__init__(*arg, **kwargs)
 
         self.charendline = None
+        self.framedelimiters = None
         for nameparam in params:
             setattr(self, nameparam, params[nameparam])
 
+        # Modo por tramas: lecturas por bloques sobre un buffer reutilizable
+        self._framebuffer = None
+        if self.framedelimiters is not None:
+            self._framebuffer = FrameBuffer(
+                self.framedelimiters[0].encode(),
+                self.framedelimiters[1].encode())
+            return
+
         self._sio = io.TextIOWrapper(io.BufferedReader(self),
                                      newline=self.charendline)
         self._sio._CHUNK_SIZE = 1
@@ -30,6 +101,103 @@ class SerialPort(Serial):
         if self.is_open:
             self.close()
 
+    def poll(self, command):
+        # Envia una peticion descartando antes lo pendiente de entrada: una
+        # respuesta que llego tarde (tras el timeout) no debe tomarse como
+        # respuesta a esta peticion
+        self.reset_input_buffer()
+        if self._framebuffer is not None:
+            self._framebuffer.clear()
+        self.write(command)
+
     def getdata(self):
+        if self._framebuffer is not None:
+            return self.getframe().decode('ascii', 'replace')
         response = self._sio.readline()
         return response
+
+    def getbytes(self, endframe):
+        if self._framebuffer is not None:
+            return self.getframe()
+        # Lee la respuesta en bytes hasta el caracter de fin de trama, sin
+        # pasar por el TextIOWrapper
+        response = self.read_until(endframe)
+        return response
+
+    def getframe(self):
+        # Lee todos los bytes disponibles de una vez hasta completar una
+        # trama. Si vence el timeout sin trama completa devuelve b''
+        frame = self._framebuffer.extract()
+        while frame is None:
+            data = self.read(self.in_waiting or 1)
+            if not data:
+                return b''
+            self._framebuffer.feed(data)
+            frame = self._framebuffer.extract()
+        return frame
+
+
+class AsyncSerialPort(SerialPort):
+
+    # Variante asyncio del puerto por tramas: el puerto se lee en modo no
+    # bloqueante y la espera se hace en el bucle de eventos, de forma que
+    # un unico hilo puede atender muchas bombas a la vez
+    def __init__(self, params, *arg, **kwargs):
+        super().__init__(params, *arg, **kwargs)
+
+        if self._framebuffer is None:
+            raise ValueError('AsyncSerialPort necesita framedelimiters')
+
+        # El timeout de la configuracion pasa a ser el plazo por trama
+        self.deadline = self.timeout
+        self.timeout = 0
+        self.pollinterval = params.get('pollinterval', 0.01)
+
+    async def waitdata(self, timeout):
+        # Espera a que haya datos en el puerto. Si el bucle no admite
+        # add_reader (p. ej. Windows) se sondea cada pollinterval
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+
+        def set_readable():
+            if not readable.done():
+                readable.set_result(None)
+
+        try:
+            fileno = self.fileno()
+            loop.add_reader(fileno, set_readable)
+        except (NotImplementedError, AttributeError, OSError):
+            if timeout is not None:
+                await asyncio.sleep(min(timeout, self.pollinterval))
+            else:
+                await asyncio.sleep(self.pollinterval)
+            return
+
+        try:
+            await asyncio.wait_for(readable, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(fileno)
+
+    async def getframe(self, timeout=None):
+        # Como SerialPort.getframe pero sin bloquear. Si vence el plazo
+        # sin trama completa devuelve b''
+        loop = asyncio.get_running_loop()
+        if timeout is None:
+            timeout = self.deadline
+        endtime = None if timeout is None else loop.time() + timeout
+
+        frame = self._framebuffer.extract()
+        while frame is None:
+            data = self.read(self.in_waiting or 1)
+            if data:
+                self._framebuffer.feed(data)
+                frame = self._framebuffer.extract()
+                continue
+
+            remaining = None if endtime is None else endtime - loop.time()
+            if remaining is not None and remaining <= 0:
+                return b''
+            await self.waitdata(remaining)
+        return frame
@@ -1,5 +1,6 @@
 # import pandas as pd
-from snowhite.serialport import SerialPort
+import asyncio
+from snowhite.serialport import SerialPort, AsyncSerialPort
 from snowhite.parser import ParserFixedWidth
 # import json
 
@@ -9,7 +10,8 @@ SERIAL_CONFIG = {'port': 'COM3',
                  'parity': 'N',
                  'stop': 1,
                  'timeout': 2,
-                 'charendline': ''}
+                 'charendline': '',
+                 'framedelimiters': ['S', 'E']}
 
 PARSER_CONFIG = {
     "delimiters": ["S", "E"],
@@ -40,30 +42,97 @@ PARSER_CONFIG = {
 
 class SWClient:
 
-    def __init__(self):
+    def __init__(self, serial_config=SERIAL_CONFIG,
+                 parser_config=PARSER_CONFIG):
 
         # with open(path_config_file) as configfile:
         #     config = json.load(configfile)
 
         # Cargamos la configuracion de puerto serie
-        self.serialport = SerialPort(SERIAL_CONFIG)
+        self.serialport = SerialPort(serial_config)
         self.serialport.connect()
 
         # Cargamos la configuracion de formato de datos
-        self.parser = ParserFixedWidth(PARSER_CONFIG)
+        self.parser = ParserFixedWidth(parser_config)
+
+    def get_fmt_data(self, record=False):
+        if record:
+            # Camino rapido: la trama se decodifica directamente en bytes.
+            # Si vence el timeout sin respuesta devuelve None
+            data = self.get_raw_bytes()
+            if not data:
+                return None
+            return self.parser.bytesparser(data)
 
-    def get_fmt_data(self):
         data = self.get_raw_data()
         df = self.parse_data(data)
 
         return df
 
-    def parse_data(self, data):
+    def parse_data(self, data, record=False):
+        # record=True devuelve un namedtuple del parser compilado;
+        # en otro caso se mantiene el DataFrame de una fila
+        if record:
+            return self.parser.recordparser(data)
         return self.parser.lineparser(data)
 
+    def parse_batch(self, frames, dataframe=False):
+        # Reprocesado de muchas tramas capturadas en una sola llamada
+        return self.parser.batchparser(frames, dataframe)
+
     def get_raw_data(self):
 
-        self.serialport.write("poll\r\n".encode())
+        self.serialport.poll("poll\r\n".encode())
         data = self.serialport.getdata()
 
         return data
+
+    def get_raw_bytes(self):
+
+        self.serialport.poll(b"poll\r\n")
+        data = self.serialport.getbytes(self.parser.endchar.encode())
+
+        return data
+
+
+class AsyncSWClient:
+
+    # Variante asyncio de SWClient: get_fmt_data es una corrutina y varias
+    # bombas se consultan desde un mismo bucle de eventos
+    def __init__(self, serial_config=SERIAL_CONFIG,
+                 parser_config=PARSER_CONFIG):
+
+        # Cargamos la configuracion de puerto serie (modo por tramas)
+        self.serialport = AsyncSerialPort(serial_config)
+        self.serialport.connect()
+
+        # Cargamos la configuracion de formato de datos
+        self.parser = ParserFixedWidth(parser_config)
+
+    async def get_fmt_data(self, record=False, timeout=None):
+        # Si vence el plazo sin respuesta devuelve None
+        data = await self.get_raw_bytes(timeout)
+        if not data:
+            return None
+        values = self.parser.bytesparser(data)
+        if record:
+            return values
+        return self.parser.todataframe(values)
+
+    async def get_raw_bytes(self, timeout=None):
+
+        self.serialport.poll(b"poll\r\n")
+        data = await self.serialport.getframe(timeout)
+
+        return data
+
+
+async def poll_clients(clients, record=False, timeout=None):
+    # Consulta todas las bombas a la vez, cada una con su plazo: el ciclo
+    # dura lo que la bomba mas lenta y no la suma de todas. Devuelve una
+    # lista con, para cada bomba, sus datos, None si no ha respondido a
+    # tiempo o la excepcion que ha dado su consulta (un fallo en una bomba
+    # no interrumpe las demas)
+    return await asyncio.gather(*(client.get_fmt_data(record, timeout)
+                                  for client in clients),
+                                return_exceptions=True)
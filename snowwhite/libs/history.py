@@ -0,0 +1,67 @@
+from bisect import bisect_right
+from collections import deque
+from itertools import islice
+import pandas as pd
+
+
+class History():
+
+    # Historico acotado de medidas ordenado por key (de la mas antigua a la
+    # mas reciente). Insertar al final y descartar la mas antigua cuando se
+    # llega a maxlen son O(1); solo una medida fuera de orden obliga a
+    # buscar su posicion.
+    def __init__(self, columns, maxlen, key='inidate'):
+
+        self.columns = list(columns)
+        self.maxlen = maxlen
+        self.keyposition = self.columns.index(key)
+        self.rows = deque()
+        # Numero de medidas de cada key: puede haber varias con la misma y
+        # la key solo deja de estar cuando se descarta la ultima
+        self.keys = {}
+        # Cambia con cada medida añadida
+        self.version = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def add(self, row):
+        row = tuple(row)
+        key = row[self.keyposition]
+        if self.maxlen <= 0:
+            return
+
+        if not self.rows or key >= self.rows[-1][self.keyposition]:
+            self.rows.append(row)
+        else:
+            # Medida fuera de orden: si es mas antigua que todo el
+            # historico lleno se descarta
+            if (len(self.rows) >= self.maxlen and
+                    key < self.rows[0][self.keyposition]):
+                return
+            position = bisect_right([item[self.keyposition]
+                                     for item in self.rows], key)
+            self.rows.insert(position, row)
+        self.keys[key] = self.keys.get(key, 0) + 1
+        self.version = self.version + 1
+
+        if len(self.rows) > self.maxlen:
+            oldest = self.rows.popleft()[self.keyposition]
+            if self.keys[oldest] > 1:
+                self.keys[oldest] = self.keys[oldest] - 1
+            else:
+                del self.keys[oldest]
+
+    def latest(self, numdata=None):
+        # Las numdata medidas mas recientes, de la ultima a la primera
+        return list(islice(reversed(self.rows), numdata))
+
+    def records(self, numdata=None):
+        # Como DataFrame.to_dict('records') de las numdata mas recientes
+        return [dict(zip(self.columns, row)) for row in self.latest(numdata)]
+
+    def todataframe(self, numdata=None):
+        return pd.DataFrame(self.latest(numdata), columns=self.columns)
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import pandas as pd
+from pandas.io.json import build_table_schema
+
+
+def convert_fields(values, fields):
+    # Tipos de las columnas segun el esquema (orient='table')
+    for field in fields:
+        name = field['name']
+        if name not in values.columns:
+            continue
+        if field['type'] == 'datetime':
+            values[name] = pd.to_datetime(values[name])
+        elif field['type'] == 'duration':
+            values[name] = pd.to_timedelta(values[name])
+    return values
+
+
+def read_table_json(path):
+    # Equivalente a pd.read_json(orient='table'), que no sabe leer las
+    # duraciones ISO ('P0DT0H10M0S') que escribe to_json
+    with open(path) as jsonfile:
+        content = json.load(jsonfile)
+    values = pd.DataFrame.from_records(content['data'])
+    return convert_fields(values, content['schema']['fields'])
+
+
+def write_table_json(df, path):
+    # Escritura atomica: fichero temporal y rename
+    tmppath = path.with_name(path.name + '.tmp')
+    df.to_json(tmppath, orient='table', index=False)
+    os.replace(tmppath, path)
+
+
+class JsonJournal():
+
+    # Fichero JSON (orient='table') con un diario JSON Lines al lado
+    # (mismo nombre, extension .jsonl) donde solo se añaden las filas nuevas
+    # o modificadas. La primera linea del diario es el esquema de las
+    # columnas. Al leer, la ultima fila de cada clave es la que vale; al
+    # compactar se reescribe el JSON completo y se vacia el diario. Hay que
+    # compactar cuando el diario llega a maxlines filas o cuando tiene filas
+    # de hace mas de maxage segundos, para que el JSON no se quede atrasado
+    # en los ficheros que crecen despacio.
+    def __init__(self, path, key, maxlines=500, maxage=None):
+
+        self.path = path
+        self.journalpath = path.with_suffix('.jsonl')
+        self.key = key
+        self.maxlines = maxlines
+        self.maxage = maxage
+        self.lastcompact = time.monotonic()
+        self.lines = 0
+        if self.journalpath.is_file():
+            with open(self.journalpath) as journalfile:
+                self.lines = max(sum(1 for _ in journalfile) - 1, 0)
+
+    def load(self):
+        # Contenido del JSON mas las filas del diario
+        values = None
+        if self.path.is_file():
+            values = read_table_json(self.path)
+
+        if self.journalpath.is_file():
+            with open(self.journalpath) as journalfile:
+                header = journalfile.readline()
+                records = []
+                for line in journalfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # Ultima linea a medio escribir
+                        break
+            if header and records:
+                journal = convert_fields(
+                    pd.DataFrame.from_records(records),
+                    json.loads(header)['fields'])
+                values = journal if values is None else pd.concat(
+                    [values, journal], ignore_index=True)
+                values = values.drop_duplicates(self.key, keep='last')
+
+        if values is not None:
+            values = values.sort_values(self.key).reset_index(drop=True)
+        return values
+
+    def append(self, rows):
+        # Añade al diario las filas (DataFrame) nuevas o modificadas
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.journalpath, 'a') as journalfile:
+            if journalfile.tell() == 0:
+                schema = build_table_schema(rows, index=False,
+                                            version=False)
+                journalfile.write(json.dumps(schema) + '\n')
+            lines = rows.to_json(orient='records', lines=True,
+                                 date_format='iso')
+            journalfile.write(lines if lines.endswith('\n') else
+                              lines + '\n')
+        self.lines = self.lines + len(rows)
+
+    @property
+    def pending(self):
+        if self.lines >= self.maxlines:
+            return True
+        return (self.lines > 0 and self.maxage is not None and
+                time.monotonic() - self.lastcompact >= self.maxage)
+
+    def compact(self, df=None):
+        # Reescribe el JSON con el contenido df (por defecto el del propio
+        # JSON mas el diario) y vacia el diario
+        if df is None:
+            df = self.load()
+        if df is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            write_table_json(df, self.path)
+        if self.journalpath.is_file():
+            os.remove(self.journalpath)
+        self.lines = 0
+        self.lastcompact = time.monotonic()
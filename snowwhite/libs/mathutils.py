@@ -7,32 +7,119 @@ def gaussian(x, mu, sigma):
     return A * np.exp(-exponent)
 
 
-class CentralStats():
+class WelfordStats():
 
-    def __init__(self, n, _sum, _sumsq):
+    # Media y suma de cuadrados de las desviaciones (m2) actualizadas con el
+    # algoritmo de Welford: varianza estable aunque la media sea grande
+    # frente a la dispersion. Dos acumuladores se combinan con la formula
+    # de Chan et al., asi que se pueden calcular por partes (hilos,
+    # procesos, horas, ficheros) y juntarlos despues.
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
         self.n = n
-        self._sum = _sum
-        self._sumsq = _sumsq
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def fromsums(cls, n, _sum, _sumsq):
+        # Desde los sumatorios de CentralStats
+        stats = cls()
+        stats.setsums(n, _sum, _sumsq)
+        return stats
+
+    def setsums(self, n, _sum, _sumsq):
+        # Estado a partir de n, suma y suma de cuadrados
+        self.reset()
+        if n > 0:
+            self.n = n
+            self.mean = _sum / n
+            self.m2 = max(_sumsq - n * self.mean * self.mean, 0.0)
+
+    @classmethod
+    def fromvalues(cls, values):
+        stats = cls()
+        stats.add_many(values)
+        return stats
 
     def add(self, x):
         self.n = self.n + 1
-        self._sum = self._sum + x
-        self._sumsq = self._sumsq + (x * x)
+        delta = x - self.mean
+        self.mean = self.mean + delta / self.n
+        self.m2 = self.m2 + delta * (x - self.mean)
+
+    def add_many(self, values):
+        # Añade un array de una vez (se ignoran los NaN)
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        mean = values.mean()
+        self.merge(WelfordStats(values.size, mean,
+                                np.square(values - mean).sum()))
+
+    def merge(self, other):
+        # Combina otro acumulador en este (Chan et al.)
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean, self.m2 = other.n, other.mean, other.m2
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.n / n
+        self.m2 = self.m2 + other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        return self
+
+    def __iadd__(self, other):
+        if isinstance(other, WelfordStats):
+            return self.merge(other)
+        self.add(other)
+        return self
 
-    def get_stats(self):
-        mean = self._sum / self.n
-        variance = (self._sumsq / self.n) - (mean * mean)
+    def __add__(self, other):
+        return self.copy().merge(other)
+
+    def copy(self):
+        return WelfordStats(self.n, self.mean, self.m2)
+
+    def variance(self, ddof=0):
+        if self.n - ddof <= 0:
+            return np.nan
+        return self.m2 / (self.n - ddof)
+
+    def get_stats(self, ddof=0):
+        # Igual que CentralStats.get_stats: media, varianza, desviacion y
+        # error de la media
+        if self.n == 0:
+            return np.nan, np.nan, np.nan, np.nan
+        variance = self.variance(ddof)
         std = np.sqrt(variance)
-        error = std / np.sqrt(self.n)
-        return mean, variance, std, error
+        return self.mean, variance, std, std / np.sqrt(self.n)
 
     def get_sums(self):
-        return self.n, self._sum, self._sumsq
+        # Sumatorios equivalentes a los de CentralStats
+        return (self.n, self.n * self.mean,
+                self.m2 + self.n * self.mean * self.mean)
 
     def reset(self):
         self.n = 0
-        self._sum = 0.0
-        self._sumsq = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+
+class CentralStats(WelfordStats):
+
+    # Interfaz original (n, suma y suma de cuadrados) sobre WelfordStats:
+    # los sumatorios de cada filtro se guardan (columnas n, sum, sumsq) y
+    # get_sums los sigue devolviendo, pero la media y la varianza se
+    # actualizan con Welford y no con sumsq/n - media^2
+    __slots__ = ()
+
+    def __init__(self, n=0, _sum=0.0, _sumsq=0.0):
+        super().__init__()
+        self.setsums(n, _sum, _sumsq)
 
 
 class RecursiveStats:
@@ -1,5 +1,89 @@
 import pandas as pd
-from io import StringIO
+from collections import namedtuple
+from datetime import datetime
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:
+    # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+
+def convert_to_float(x):
+    try:
+        return float(x)
+    except ValueError:
+        return None
+
+
+def convert_to_datetime(x):
+    try:
+        return pd.Timestamp(x)
+    except ValueError:
+        return None
+
+
+def convert_to_timedelta(x):
+    try:
+        return pd.Timedelta(x)
+    except ValueError:
+        return None
+
+
+# Funciones de conversión del parser compilado
+CONVERTER = {
+    'int': convert_to_float,
+    'int64': convert_to_float,
+    'float': convert_to_float,
+    'float64': convert_to_float,
+    'datetime': convert_to_datetime,
+    'timedelta': convert_to_timedelta
+}
+
+
+def parse_dayfirst(x):
+    # Las fechas de la bomba llevan el dia primero (05/03/2024 es el 5 de
+    # marzo)
+    try:
+        return pd.to_datetime(x, dayfirst=True)
+    except (ValueError, TypeError):
+        return None
+
+
+def compile_converter(fieldtype, dtformat=None):
+    # Conversor del parser compilado. Para las fechas se usa el formato de
+    # la configuracion ('format') o, si no hay, se deduce con el primer
+    # valor (con el dia primero) y se reutiliza con strptime, mucho mas
+    # rapido que dejar que pandas lo infiera en cada muestra. Si el formato
+    # no sirve para un valor se deduce de nuevo para ese valor
+    if fieldtype != 'datetime':
+        return CONVERTER[fieldtype]
+
+    # El formato configurado no cambia nunca; el deducido se sustituye si
+    # deja de servir
+    guessedformat = [None]
+
+    def converter(x):
+        currentformat = dtformat or guessedformat[0]
+        if currentformat is None:
+            currentformat = guessedformat[0] = guess_datetime_format(
+                x, dayfirst=True)
+        if currentformat is not None:
+            try:
+                return pd.Timestamp(datetime.strptime(x, currentformat))
+            except ValueError:
+                pass
+        guessed = guess_datetime_format(x, dayfirst=True)
+        if guessed is not None and guessed != currentformat:
+            try:
+                value = pd.Timestamp(datetime.strptime(x, guessed))
+                if dtformat is None:
+                    guessedformat[0] = guessed
+                return value
+            except ValueError:
+                pass
+        return parse_dayfirst(x)
+
+    return converter
 
 
 class ParserFixedWidth():
@@ -12,22 +96,39 @@ class ParserFixedWidth():
         self.names = []
         self.positions = []
         self.types = {}
+        self.formats = {}
         self.parse_dates = []
 
         for name in parameters:
             self.names.append(name)
             self.positions.append(tuple(parameters[name]['position']))
             self.types[name] = parameters[name]['type']
+            self.formats[name] = parameters[name].get('format')
             if parameters[name]['type'] == 'datetime':
                 self.parse_dates.append(name)
 
+        # Parser compilado: los offsets de cada campo y su funcion de
+        # conversion se calculan una unica vez
+        self.record = namedtuple('SnowWhiteRecord', self.names)
+        self.fields = [(slice(*self.positions[i]),
+                        compile_converter(self.types[name],
+                                          self.formats[name]))
+                       for i, name in enumerate(self.names)]
+
+    def recordparser(self, linedata):
+        # Devuelve un registro ligero (namedtuple) sin pasar por pandas
+        strdata = linedata[linedata.find(self.inichar) +
+                           1:linedata.find(self.endchar)]
+        return self.record._make([converter(strdata[field].strip())
+                                  for field, converter in self.fields])
+
+    def todataframe(self, records):
+        # Convierte uno o varios registros en un DataFrame
+        if isinstance(records, self.record):
+            records = [records]
+        return pd.DataFrame.from_records(records, columns=self.names)
+
     def lineparser(self, linedata):
-        strdata = StringIO(linedata[linedata.find(self.inichar) +
-                                    1:linedata.find(self.endchar)])
-        values = pd.read_fwf(strdata,
-                             index_col=False,
-                             names=self.names,
-                             colspecs=self.positions,
-                             dtypes=self.types,
-                             parse_dates=self.parse_dates)
-        return values
+        # DataFrame de una fila con las mismas conversiones (y el mismo
+        # criterio de fechas, dia primero) que recordparser
+        return self.todataframe(self.recordparser(linedata))
@@ -0,0 +1,68 @@
+import pandas as pd
+
+
+class SampleRegistry():
+
+    # Registro de las medidas de filtros indexado por su fecha de inicio.
+    # Los filtros cerrados se guardan en una lista a la que solo se añade y
+    # el filtro activo es la unica fila que se modifica; el diccionario de
+    # indices da la posicion de cada filtro sin recorrer la tabla.
+    def __init__(self, columns, key='measuretime'):
+
+        self.columns = list(columns)
+        self.key = key
+        self.keyposition = self.columns.index(key)
+        self.closed = []
+        self.index = {}
+        self.active = None
+        # Cambia con cada modificacion (para cachear el DataFrame)
+        self.version = 0
+
+    @classmethod
+    def fromdataframe(cls, df, key='measuretime'):
+        registry = cls(df.columns, key)
+        for row in df.itertuples(index=False, name=None):
+            registry.set(row)
+        return registry
+
+    def __len__(self):
+        return len(self.closed) + (self.active is not None)
+
+    def __contains__(self, key):
+        return (key in self.index or
+                (self.active is not None and self.keyof(self.active) == key))
+
+    def keyof(self, row):
+        return row[self.keyposition]
+
+    def set(self, row):
+        # Actualiza el filtro activo o empieza uno nuevo
+        row = tuple(row)
+        key = self.keyof(row)
+        if self.active is not None and self.keyof(self.active) == key:
+            self.active = row
+        elif key in self.index:
+            # Filtro ya cerrado (p. ej. si el reloj de la bomba retrocede)
+            self.closed[self.index[key]] = row
+        else:
+            if self.active is not None:
+                self.index[self.keyof(self.active)] = len(self.closed)
+                self.closed.append(self.active)
+            self.active = row
+        self.version = self.version + 1
+
+    def get(self, key):
+        if self.active is not None and self.keyof(self.active) == key:
+            return self.active
+        if key in self.index:
+            return self.closed[self.index[key]]
+        return None
+
+    def rowframe(self, key):
+        # Una fila como DataFrame (para el diario)
+        return pd.DataFrame([self.get(key)], columns=self.columns)
+
+    def todataframe(self):
+        rows = self.closed if self.active is None else (self.closed +
+                                                        [self.active])
+        return pd.DataFrame(rows, columns=self.columns).infer_objects()
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+# dtype de los arrays segun el tipo de campo del parser
+DTYPES = {
+    'int': np.float64,
+    'int64': np.float64,
+    'float': np.float64,
+    'float64': np.float64,
+    'datetime': 'datetime64[ns]',
+    'timedelta': 'timedelta64[ns]'
+}
+
+# Conversion de los valores del parser (p. ej. '00:00:05') a cada dtype
+COERCE = {
+    np.dtype('datetime64[ns]'): lambda value: pd.Timestamp(value).asm8,
+    np.dtype('timedelta64[ns]'): lambda value: pd.Timedelta(value).asm8,
+    np.dtype(np.float64): float
+}
+
+
+class RingBuffer():
+
+    # Ventana deslizante de capacidad fija con un array NumPy por campo,
+    # ordenada por timefield. Cada valor se escribe dos veces (posiciones i
+    # e i + capacity), asi la ventana [head, head + size) siempre es un
+    # tramo contiguo y se devuelve como vista sin copiar. Si se llena se
+    # descarta la muestra mas antigua.
+    def __init__(self, types, capacity, timefield):
+
+        self.names = list(types)
+        self.capacity = capacity
+        self.timefield = timefield
+        self.arrays = {name: np.empty(2 * capacity,
+                                      DTYPES.get(types[name], object))
+                       for name in self.names}
+        self.head = 0
+        self.size = 0
+        # Cambia con cada modificacion (para cachear lo que se calcule a
+        # partir de la ventana)
+        self.version = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def empty(self):
+        return self.size == 0
+
+    def append(self, values):
+        # values: diccionario, Series o namedtuple con los campos
+        if not isinstance(values, dict):
+            values = values._asdict() if hasattr(values, '_asdict') else \
+                dict(values)
+        if self.size == self.capacity:
+            self.head = (self.head + 1) % self.capacity
+            self.size = self.size - 1
+
+        position = (self.head + self.size) % self.capacity
+        for name in self.names:
+            value = self.coerce(name, values[name])
+            array = self.arrays[name]
+            array[position] = array[position + self.capacity] = value
+        self.size = self.size + 1
+        self.version = self.version + 1
+
+    def coerce(self, name, value):
+        # Valor convertido al dtype del campo. Si no se puede convertir el
+        # campo pasa a guardarse como objeto (como hacia pd.concat)
+        array = self.arrays[name]
+        if array.dtype == object:
+            return value
+        if value is None or (np.ndim(value) == 0 and pd.isna(value)):
+            return self.missing(array)
+        try:
+            return COERCE[array.dtype](value)
+        except (ValueError, TypeError, OverflowError):
+            self.arrays[name] = pd.Series(array).astype(object).to_numpy()
+            return value
+
+    @staticmethod
+    def missing(array):
+        if array.dtype.kind in 'mM':
+            return array.dtype.type('NaT')
+        return np.nan
+
+    def expire(self, cutoff):
+        # Descarta las muestras con timefield <= cutoff
+        nexpired = np.searchsorted(self[self.timefield], np.datetime64(cutoff),
+                                   side='right')
+        if nexpired > 0:
+            self.head = (self.head + nexpired) % self.capacity
+            self.size = self.size - nexpired
+            self.version = self.version + 1
+        return nexpired
+
+    def __getitem__(self, name):
+        # Vista de solo lectura de un campo, de la mas antigua a la ultima
+        view = self.arrays[name][self.head:self.head + self.size]
+        view.flags.writeable = False
+        return view
+
+    def last(self, name):
+        return self.arrays[name][self.head + self.size - 1]
+
+    def todataframe(self):
+        # Copia de la ventana como DataFrame
+        return pd.DataFrame({name: self[name] for name in self.names},
+                            columns=self.names)
@@ -2,6 +2,67 @@ from serial import Serial, SerialException
 import io
 
 
+class FrameBuffer():
+
+    # Buffer de bytes reutilizable del que se extraen tramas completas
+    # inichar...endchar. Los restos de tramas incompletas se conservan
+    # para la siguiente lectura y la basura se descarta.
+    def __init__(self, inichar, endchar, size=4096):
+        self.inichar = inichar
+        self.endchar = endchar
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def compact(self):
+        # Mueve los bytes pendientes al principio del buffer
+        pending = self.end - self.start
+        self.buffer[:pending] = self.view[self.start:self.end]
+        self.start = 0
+        self.end = pending
+
+    def feed(self, data):
+        size = len(self.buffer)
+        if len(data) > size - self.end:
+            self.compact()
+        if len(data) > size - self.end:
+            # Buffer lleno sin tramas validas: se conservan los ultimos bytes
+            data = bytes(self.view[self.start:self.end]) + data
+            data = data[-size:]
+            self.start = 0
+            self.end = 0
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end = self.end + len(data)
+
+    def clear(self):
+        self.start = self.end = 0
+
+    def extract(self):
+        ini = self.buffer.find(self.inichar, self.start, self.end)
+        if ini < 0:
+            # Ningun inicio de trama: todo lo pendiente es basura
+            self.start = self.end = 0
+            return None
+        self.start = ini
+
+        fin = self.buffer.find(self.endchar, ini + 1, self.end)
+        if fin < 0:
+            return None
+
+        # Si hay otro inicio antes del fin, la trama anterior esta rota y
+        # se resincroniza con el ultimo inicio
+        ini = self.buffer.rfind(self.inichar, ini, fin)
+        frame = bytes(self.view[ini:fin + 1])
+        self.start = fin + 1
+        if self.start == self.end:
+            self.start = self.end = 0
+        return frame
+
+
 class SerialPort(Serial):
 
     # iniciamos la clase: Esto será en un archivo aparte
@@ -10,9 +71,18 @@ class SerialPort(Serial):
         super().__init__(*arg, **kwargs)
 
         self.charendline = None
+        self.framedelimiters = None
         for nameparam in params:
             setattr(self, nameparam, params[nameparam])
 
+        # Modo por tramas: lecturas por bloques sobre un buffer reutilizable
+        self._framebuffer = None
+        if self.framedelimiters is not None:
+            self._framebuffer = FrameBuffer(
+                self.framedelimiters[0].encode(),
+                self.framedelimiters[1].encode())
+            return
+
         self._sio = io.TextIOWrapper(io.BufferedReader(self),
                                      newline=self.charendline)
         self._sio._CHUNK_SIZE = 1
@@ -30,6 +100,38 @@ class SerialPort(Serial):
         if self.is_open:
             self.close()
 
+    def poll(self, command):
+        # Envia una peticion descartando antes lo pendiente de entrada: una
+        # respuesta que llego tarde (tras el timeout) no debe tomarse como
+        # respuesta a esta peticion
+        self.reset_input_buffer()
+        if self._framebuffer is not None:
+            self._framebuffer.clear()
+        self.write(command)
+
     def getdata(self):
+        if self._framebuffer is not None:
+            return self.getframe().decode('ascii', 'replace')
         response = self._sio.readline()
         return response
+
+    def getbytes(self, endframe):
+        if self._framebuffer is not None:
+            return self.getframe()
+        # Lee la respuesta en bytes hasta el caracter de fin de trama, sin
+        # pasar por el TextIOWrapper
+        response = self.read_until(endframe)
+        return response
+
+    def getframe(self):
+        # Lee todos los bytes disponibles de una vez hasta completar una
+        # trama. Si vence el timeout sin trama completa devuelve b''
+        frame = self._framebuffer.extract()
+        while frame is None:
+            data = self.read(self.in_waiting or 1)
+            if not data:
+                return b''
+            self._framebuffer.feed(data)
+            frame = self._framebuffer.extract()
+        return frame
+
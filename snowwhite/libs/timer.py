@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 # import pytz
-from threading import Timer
+from threading import Timer, Thread, Condition, Event, current_thread
+from time import monotonic, time
 
 
 class RepeatTimer(Timer):
@@ -30,6 +31,160 @@ def nextevent(interval, dt_now):  # interval en segundos
     return dt_prev, dt_run
 
 
+# Politicas para los ticks perdidos (la tarea anterior se ha alargado o el
+# proceso ha estado parado):
+# SKIP: se saltan y se sigue en el siguiente punto de la rejilla
+# CATCHUP: se ejecutan todos seguidos hasta ponerse al dia
+# COALESCE: se ejecuta una sola vez por todos y se sigue en la rejilla
+SKIP = 'skip'
+CATCHUP = 'catchup'
+COALESCE = 'coalesce'
+
+
+class Job():
+
+    # Tarea periodica del planificador con sus estadisticas: retraso del
+    # inicio respecto al tick de la rejilla (jitter), duracion, ticks
+    # perdidos y ejecuciones mas largas que el intervalo (overruns)
+    def __init__(self, interval, function, args=None, kwargs=None,
+                 policy=COALESCE):
+
+        if policy not in (SKIP, CATCHUP, COALESCE):
+            raise ValueError('Politica desconocida: ' + str(policy))
+        self.interval = interval  # segundos
+        self.function = function
+        self.args = args if args is not None else []
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.policy = policy
+        self.due = None  # tick de la rejilla (reloj monotono)
+        self.next = None  # momento de la proxima ejecucion
+        self.cancelled = False
+
+        self.runs = 0
+        self.missed = 0
+        self.overruns = 0
+        self.errors = 0
+        self.jitter = 0.0
+        self.maxjitter = 0.0
+        self.maxduration = 0.0
+
+    def schedule(self, now):
+        # Siguiente ejecucion tras terminar el tick self.due
+        due = self.due + self.interval
+        if due > now or self.policy == CATCHUP:
+            self.due = self.next = due
+            return
+        missed = int((now - due) // self.interval) + 1
+        self.missed = self.missed + missed
+        if self.policy == SKIP:
+            self.due = self.next = due + missed * self.interval
+        else:
+            # Una unica ejecucion ahora en lugar del ultimo tick perdido
+            self.due = due + (missed - 1) * self.interval
+            self.next = now
+
+    def stats(self):
+        return {'interval': self.interval,
+                'policy': self.policy,
+                'runs': self.runs,
+                'missed': self.missed,
+                'overruns': self.overruns,
+                'errors': self.errors,
+                'meanjitter': self.jitter / self.runs if self.runs else 0.0,
+                'maxjitter': self.maxjitter,
+                'maxduration': self.maxduration}
+
+
+class Scheduler(Thread):
+
+    # Un unico hilo para muchas tareas periodicas. Los ticks estan
+    # alineados con la hora del reloj (multiplos del intervalo, como
+    # RepeatTimer) pero despues se cuentan con time.monotonic(), de modo que
+    # los saltos del reloj del sistema no adelantan ni retrasan las tareas
+    # y los retrasos de una ejecucion no se acumulan.
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.jobs = []
+        self.running = None  # tarea en ejecucion
+        self.condition = Condition()
+        self.finished = Event()
+
+    def add(self, interval, function, args=None, kwargs=None,
+            policy=COALESCE, aligned=True):
+        job = Job(interval, function, args, kwargs, policy)
+        now = monotonic()
+        job.due = job.next = now
+        if aligned:
+            tm_now = time()
+            job.due = job.next = now + (
+                (tm_now // interval + (tm_now % interval > 0)) * interval -
+                tm_now)
+        with self.condition:
+            self.jobs.append(job)
+            self.condition.notify_all()
+        return job
+
+    def remove(self, job, wait=False):
+        # Quita la tarea. Con wait=True espera ademas a que termine si se
+        # esta ejecutando (salvo si se llama desde la propia tarea)
+        with self.condition:
+            job.cancelled = True
+            if job in self.jobs:
+                self.jobs.remove(job)
+            self.condition.notify_all()
+            if wait and current_thread() is not self:
+                while self.running is job:
+                    self.condition.wait()
+
+    def run(self):
+        while not self.finished.is_set():
+            with self.condition:
+                if not self.jobs:
+                    self.condition.wait()
+                    continue
+                job = min(self.jobs, key=lambda item: item.next)
+                delay = job.next - monotonic()
+                if delay > 0:
+                    # Se despierta antes si se añaden o quitan tareas
+                    self.condition.wait(delay)
+                    continue
+                self.running = job
+
+            # El retraso se mide respecto al tick de la rejilla: con
+            # COALESCE la ejecucion se adelanta (next) pero el tick que
+            # cubre es due
+            start = monotonic()
+            jitter = start - job.due
+            try:
+                job.function(*job.args, **job.kwargs)
+            except Exception as error:
+                # Un error en una tarea no para las demas
+                job.errors = job.errors + 1
+                print('Error en la tarea periodica: ' + repr(error))
+            end = monotonic()
+            with self.condition:
+                self.running = None
+                self.condition.notify_all()
+
+            duration = end - start
+            job.runs = job.runs + 1
+            job.jitter = job.jitter + jitter
+            job.maxjitter = max(job.maxjitter, jitter)
+            job.maxduration = max(job.maxduration, duration)
+            if duration > job.interval:
+                job.overruns = job.overruns + 1
+            job.schedule(end)
+
+    def cancel(self):
+        # Para el planificador (como Timer.cancel)
+        self.finished.set()
+        with self.condition:
+            self.condition.notify_all()
+
+    def stats(self):
+        return [job.stats() for job in self.jobs]
+
+
 # TESTING
 
 # import time
@@ -5,7 +5,7 @@ import tkinter as tk
 import pygubu
 import sys
 from snowwhitecore import SnowWhiteData
-from libs.timer import RepeatTimer
+from libs.timer import Scheduler, SKIP
 from libs.mathutils import gaussian
 import pandas as pd
 import numpy as np
@@ -60,10 +60,16 @@ class SnowWhiteApp:
         # with open('config.json') as configfile:
         #     config = json.load(configfile)
 
-        self.snowwhite = SnowWhiteData(OUTPUT_FOLDER, TIME_STEP)
+        # Un unico planificador para todas las tareas periodicas: la
+        # consulta a la bomba y, desde SnowWhiteData, la escritura de los
+        # ficheros y la compactacion de los diarios
+        self.trigger = Scheduler()
+        self.snowwhite = SnowWhiteData(OUTPUT_FOLDER, TIME_STEP,
+                                       journal=True, scheduler=self.trigger)
 
         # Iniciamos el update
-        self.trigger = RepeatTimer(TIME_STEP, self.update)
+        self.closing = False
+        self.trigger.add(TIME_STEP, self.update, policy=SKIP)
         self.trigger.start()
 
     def run(self):
@@ -184,8 +190,22 @@ class SnowWhiteApp:
                                     sampledata[col].values[-1]))
 
     def close(self):
-        self.mainwindow.destroy()
+        # Se para el planificador y se espera a que termine la tarea en
+        # curso antes de cerrar los ficheros. La tarea actualiza la interfaz,
+        # asi que la espera se hace sin bloquear el bucle de Tk
+        if self.closing:
+            return
+        self.closing = True
         self.trigger.cancel()
+        self.wait_close()
+
+    def wait_close(self):
+        if self.trigger.is_alive():
+            self.mainwindow.after(100, self.wait_close)
+            return
+        # Instantanea del estado para el proximo arranque
+        self.snowwhite.close()
+        self.mainwindow.destroy()
 
 
 if __name__ == "__main__":
@@ -7,13 +7,24 @@ import libs.serialport
 import libs.parser
 from libs.mathutils import timediffseconds
 from libs.mathutils import RecursiveStats
-from libs.timer import RepeatTimer, nextevent
+from libs.timer import Scheduler, SKIP, nextevent
+from libs.history import History
 
 import threading
+from collections import namedtuple
 
 PWD = pathlib.Path(sys.executable).parent
 OUTPUT_FOLDER = PWD / 'Output_Snowwhite'
 
+MEASURE_COLUMNS = [
+    'inidate', 'enddate', 'flow', 'errorflow', 'volume', 'errorvolume'
+]
+
+# Datos publicados para los lectores (tuplas de registros, no se modifican)
+DataSnapshot = namedtuple('DataSnapshot',
+                          ['intervaldata', 'gammadata', 'sampledata',
+                           'gammaversion', 'sampleversion'])
+
 
 class SnowWhite:
     """ Clase Comunicación RS485 snowwhite
@@ -44,12 +55,12 @@ class SnowWhite:
                     "startdatetime": {
                         "position": [1,20],
                         "type": "datetime",
-                        "format": "%d/%m/%Y %H:%m:%s"
+                        "format": "%d/%m/%Y %H:%M:%S"
                     },
                     "duration": {
                         "position": [21,29],
                         "type": "datetime",
-                        "format": "%H:%m:%s"
+                        "format": "%H:%M:%S"
                     },
                     "status": {
                         "position": [30,31],
@@ -110,7 +121,7 @@ class SnowWhite:
                     "actualdatetime": {
                         "position": [101,120],
                         "type": "datetime",
-                        "format": "%d/%m/%Y %H:%m:%s"
+                        "format": "%d/%m/%Y %H:%M:%S"
                     },
                     "unknown0": {
                         "position": [121,128],
@@ -135,8 +146,8 @@ class SnowWhite:
 
     """
 
-    def __init__(self, config: dict) -> None:
-        """ Inicia la clase. Únicamente tiene como parámetro un diccionario con
+    def __init__(self, config: dict, scheduler: Scheduler = None) -> None:
+        """ Inicia la clase. Tiene como parámetro un diccionario con
         los valores de configuración. La configuración se divide en varias
         secciones:
 
@@ -144,14 +155,20 @@ class SnowWhite:
         * configuracion puerto seria: Configuración de los parámetros del puerto serie
         * configuracion parser: Configuración del formato de recibidos.
 
+        Opcionalmente recibe un planificador compartido con otras tareas
+        periódicas; si no se indica se crea uno propio.
+
         """
-        # Cargamos la configuracion de puerto serie
-        self.serialport = libs.serialport.SerialPort(
-            config['configuracion puerto serie'])
+        # Cargamos la configuracion de puerto serie. Por defecto se lee en
+        # modo por tramas con los delimitadores del parser
+        configparser = config['configuracion parser']
+        configserial = dict(config['configuracion puerto serie'])
+        configserial.setdefault('framedelimiters',
+                                configparser['delimitadores'])
+        self.serialport = libs.serialport.SerialPort(configserial)
         self.serialport.connect()
 
         # Cargamos la configuracion de formato de datos
-        configparser = config['configuracion parser']
         self.parser = libs.parser.ParserFixedWidth(
             configparser['parametros'], configparser['delimitadores'])
 
@@ -160,30 +177,71 @@ class SnowWhite:
         for nameparam in configmeasure:
             setattr(self, nameparam, configmeasure[nameparam])
 
-        # Buffer datos
-        self.intervaldf = pd.DataFrame()
-        self.gammadf = pd.DataFrame(columns=[
-            'inidate', 'enddate', 'flow', 'errorflow', 'volume', 'errorvolume'
-        ])
+        # Ultimo dato recibido (diccionario con los campos del registro)
+        self.intervaldata = {}
+        # Historicos de medidas acotados a numbkdata, los DataFrame solo se
+        # construyen cuando se piden
+        self.gammahistory = History(MEASURE_COLUMNS, self.numbkdata)
         self.gammabuffer = {
             'inimeasure': None,
             'endmeasure': None,
             'measure': RecursiveStats()
         }
 
-        self.sampledf = pd.DataFrame(columns=[
-            'inidate', 'enddate', 'flow', 'errorflow', 'volume', 'errorvolume'
-        ])
+        self.samplehistory = History(MEASURE_COLUMNS, self.numbkdata)
         self.samplebuffer = {
             'inimeasure': None,
             'endmeasure': None,
             'measure': RecursiveStats()
         }
 
+        # Ultimos datos publicados: update_data sustituye la instantanea
+        # completa y getdata lee la ultima sin esperar a la adquisicion
+        self.snapshot = DataSnapshot((), (), (), 0, 0)
+
         # Iniciamos el update
         self.dflock = threading.Lock()
-        self.trigger = RepeatTimer(self.timeperiod, self.update_data)
-        self.trigger.start()
+        self.ownscheduler = scheduler is None
+        self.trigger = scheduler
+        self.job = None
+        self.start_trigger()
+
+    @property
+    def intervaldf(self) -> pd.DataFrame:
+        """
+        Último dato recibido como DataFrame de una fila.
+
+        :rtype: pandas.DataFrame
+
+        """
+
+        if not self.intervaldata:
+            return pd.DataFrame()
+        return pd.DataFrame([self.intervaldata])
+
+    @property
+    def gammadf(self) -> pd.DataFrame:
+        """
+        Medidas gamma guardadas, de la más reciente a la más antigua.
+
+        :rtype: pandas.DataFrame
+
+        """
+
+        return pd.DataFrame(list(self.snapshot.gammadata),
+                            columns=MEASURE_COLUMNS)
+
+    @property
+    def sampledf(self) -> pd.DataFrame:
+        """
+        Medidas de filtros guardadas, de la más reciente a la más antigua.
+
+        :rtype: pandas.DataFrame
+
+        """
+
+        return pd.DataFrame(list(self.snapshot.sampledata),
+                            columns=MEASURE_COLUMNS)
 
     def thread_status(self) -> bool:
         """
@@ -196,7 +254,8 @@ class SnowWhite:
 
         """
 
-        return self.trigger.is_alive()
+        return (self.trigger.is_alive() and self.job is not None and
+                not self.job.cancelled)
 
     def thread_reboot(self) -> None:
         """
@@ -206,11 +265,41 @@ class SnowWhite:
 
         """
 
-        if self.thread_status():
-            self.trigger.cancel()
+        self.stop_trigger()
+        self.start_trigger()
 
-        self.trigger = RepeatTimer(self.timeperiod, self.update_data)
-        self.trigger.start()
+    def start_trigger(self) -> None:
+        """
+        Registra en el planificador la tarea que llama a update_data cada
+        timeperiod segundos (reloj monótono, ticks alineados). Si una
+        consulta se retrasa se salta al siguiente tick. Con planificador
+        propio lo crea y lo arranca.
+
+        :rtype: None
+
+        """
+
+        if self.ownscheduler:
+            self.trigger = Scheduler()
+        self.job = self.trigger.add(self.timeperiod, self.update_data,
+                                    policy=SKIP)
+        if self.ownscheduler:
+            self.trigger.start()
+
+    def stop_trigger(self) -> None:
+        """
+        Quita la tarea del planificador esperando a que termine la consulta
+        en curso. Con planificador propio además lo para.
+
+        :rtype: None
+
+        """
+
+        if self.job is not None:
+            self.trigger.remove(self.job, wait=True)
+        if self.ownscheduler and self.trigger.is_alive():
+            self.trigger.cancel()
+            self.trigger.join()
 
     def update_data(self) -> None:
         """
@@ -221,14 +310,22 @@ class SnowWhite:
 
         """
 
+        # La consulta al puerto serie se hace fuera del bloqueo
+        record, shift_time = self.get_rtdata()
+        if pd.isna(record.actualdatetime) or pd.isna(record.flowrate):
+            # Sin respuesta o trama incompleta: no se almacena
+            print('Trama descartada: ' + str(record))
+            return
+        values = record._asdict()
+        values['shiftime'] = shift_time.total_seconds()
+
         self.dflock.acquire()
 
-        self.intervaldf, shift_time = self.get_rtdata()
-        self.intervaldf['shiftime'] = [shift_time.total_seconds()]
+        self.intervaldata = values
 
         # GAMMA MEASURE
-        inimeasure, endmeasure = nextevent(
-            self.gammaperiod, self.intervaldf['actualdatetime'].iloc[0])
+        inimeasure, endmeasure = nextevent(self.gammaperiod,
+                                           values['actualdatetime'])
 
         if endmeasure != self.gammabuffer['endmeasure']:
             if self.gammabuffer['endmeasure'] is not None:
@@ -240,38 +337,29 @@ class SnowWhite:
                     (flow / 3600) * self.gammaperiod,
                     (errorflow / 3600) * self.gammaperiod
                 ]
-                self.gammadf.loc[len(self.gammadf) + 1] = new_measure
-                # eliminar filas necesarias para que el df tenga el
-                # tamaño asignado en el config
-                self.gammadf.sort_values(by='inidate',
-                                         ascending=False,
-                                         inplace=True)
-                self.gammadf = self.gammadf.reset_index(drop=True)
-                self.gammadf = self.gammadf.iloc[:self.numbkdata, :]
+                # el historico descarta la medida mas antigua al superar
+                # el tamaño asignado en el config
+                self.gammahistory.add(new_measure)
 
             self.gammabuffer['endmeasure'] = endmeasure
             self.gammabuffer['inimeasure'] = inimeasure
             self.gammabuffer['measure'].reset()
 
-        self.gammabuffer['measure'] += self.intervaldf['flowrate'].iloc[0]
+        self.gammabuffer['measure'] += values['flowrate']
 
         # SAMPLE MEASURE
-        if self.intervaldf['status'].iloc[0] == 1:
+        if values['status'] == 1:
 
-            if self.intervaldf['startdatetime'].iloc[0] != self.samplebuffer[
-                    'inimeasure']:
-                self.samplebuffer['inimeasure'] = self.intervaldf[
-                    'startdatetime'].iloc[0]
+            if values['startdatetime'] != self.samplebuffer['inimeasure']:
+                self.samplebuffer['inimeasure'] = values['startdatetime']
                 self.samplebuffer['measure'].reset()
 
-            self.samplebuffer['endmeasure'] = self.intervaldf[
-                'actualdatetime'].iloc[0]
+            self.samplebuffer['endmeasure'] = values['actualdatetime']
 
-            self.samplebuffer['measure'] += self.intervaldf['flowrate'].iloc[0]
+            self.samplebuffer['measure'] += values['flowrate']
 
-        elif self.intervaldf['status'].iloc[0] == 0:
-            if self.samplebuffer['inimeasure'] not in self.sampledf[
-                    'inidate'].values:
+        elif values['status'] == 0:
+            if self.samplebuffer['inimeasure'] not in self.samplehistory:
                 # guardamos en el df
                 n, flow, errorflow = self.samplebuffer['measure'].stats
                 duration = timediffseconds(self.samplebuffer['inimeasure'],
@@ -281,35 +369,58 @@ class SnowWhite:
                     self.samplebuffer['endmeasure'], flow, errorflow,
                     (flow / 3600) * duration, (errorflow / 3600) * duration
                 ]
-                self.sampledf.loc[len(self.sampledf) + 1] = new_measure
-                # eliminar filas necesarias para que el df tenga el
-                # tamaño asignado en el config
-                self.sampledf.sort_values(by='inidate',
-                                          ascending=False,
-                                          inplace=True)
-                self.sampledf = self.sampledf.reset_index(drop=True)
-                self.sampledf = self.sampledf.iloc[:self.numbkdata, :]
+                # el historico descarta la medida mas antigua al superar
+                # el tamaño asignado en el config
+                self.samplehistory.add(new_measure)
 
+        self.publish()
         self.dflock.release()
 
-    def get_rtdata(self) -> float:
+    def publish(self) -> None:
+        """
+        Publica una nueva instantánea inmutable de los datos. Los
+        históricos solo se vuelven a convertir si han cambiado.
+
+        :rtype: None
+
+        """
+
+        snapshot = self.snapshot
+        gammadata = snapshot.gammadata
+        if snapshot.gammaversion != self.gammahistory.version:
+            gammadata = tuple(self.gammahistory.records())
+        sampledata = snapshot.sampledata
+        if snapshot.sampleversion != self.samplehistory.version:
+            sampledata = tuple(self.samplehistory.records())
+
+        # La asignacion de la referencia es atomica: los lectores ven la
+        # instantanea anterior o la nueva completa
+        self.snapshot = DataSnapshot(
+            (dict(self.intervaldata), ) if self.intervaldata else (),
+            gammadata,
+            sampledata, self.gammahistory.version,
+            self.samplehistory.version)
+
+    def get_rtdata(self) -> tuple:
         """
         Consulta de los datos medidos actualmente en la estación snowwhite.
 
         :returns: Los valores medidos actualmente en la estación snowwhite
-            y el desfase temporal del reloj interno de la snowhwite con el pc
-            que hace la consulta.
-        :rtype: float
+            (registro del parser compilado) y el desfase temporal del reloj
+            interno de la snowhwite con el pc que hace la consulta.
+        :rtype: tuple
 
         """
 
-        self.serialport.write("poll\r\n".encode())
+        self.serialport.poll("poll\r\n".encode())
         data = self.serialport.getdata()
 
         utcnow = pd.Timestamp.utcnow()
-        df = self.parser.lineparser(data)
+        record = self.parser.recordparser(data)
+        if pd.isna(record.actualdatetime):
+            return record, pd.NaT
 
-        return df, utcnow.replace(tzinfo=None) - df.actualdatetime.iloc[0]
+        return record, utcnow.replace(tzinfo=None) - record.actualdatetime
 
     def getdata(self, numdata: int) -> dict:
         """
@@ -323,18 +434,21 @@ class SnowWhite:
 
         """
 
-        self.dflock.acquire()
+        # Sin bloqueo: se lee la ultima instantanea publicada y se copian
+        # los registros pedidos
+        snapshot = self.snapshot
 
         data = {'data': {}}
 
-        data['data']['ultimo dato'] = self.intervaldf[:numdata].to_dict(
-            'records')
-        data['data']['medidas gamma'] = self.gammadf[:numdata].to_dict(
-            'records')
-        data['data']['medidas filtro'] = self.sampledf[:numdata].to_dict(
-            'records')
-
-        self.dflock.release()
+        data['data']['ultimo dato'] = [
+            dict(record) for record in snapshot.intervaldata[:numdata]
+        ]
+        data['data']['medidas gamma'] = [
+            dict(record) for record in snapshot.gammadata[:numdata]
+        ]
+        data['data']['medidas filtro'] = [
+            dict(record) for record in snapshot.sampledata[:numdata]
+        ]
 
         return data
 
@@ -348,7 +462,8 @@ class SnowWhite:
 
         """
 
-        self.trigger.cancel()
+        # Se espera a que termine la consulta en curso
+        self.stop_trigger()
         self.serialport.disconnect()
 
 
@@ -1,85 +1,285 @@
+import numpy as np
 import pandas as pd
+import os
 import sys
 import json
+import time
 import pathlib
 
 import libs.serialport
 import libs.parser
 from libs.mathutils import timediffseconds
 from libs.mathutils import CentralStats
+from libs.mathutils import WelfordStats
+from libs.ringbuffer import RingBuffer
+from libs.registry import SampleRegistry
+from libs.journal import JsonJournal, read_table_json, write_table_json
+from libs.timer import COALESCE
 
 PWD = pathlib.Path(sys.executable).parent
 OUTPUT_FOLDER = PWD / 'Output_Snowwhite'
 
+# Campos con estadisticas horarias
+HOURLY_FIELDS = ['flowrate', 'Pdiff']
+
 
 class SnowWhiteData:
 
-    def __init__(self, output_folder, time_step):
+    def __init__(self, output_folder, time_step, journal=False,
+                 maxlines=500, snapshotevery=180, flushinterval=60.0,
+                 compactinterval=600.0, scheduler=None):
 
         with open('config.json') as configfile:
             config = json.load(configfile)
 
-        # Cargamos la configuracion de puerto serie
-        self.serialport = libs.serialport.SerialPort(
-            config['configuracion puerto serie'])
+        # Cargamos la configuracion de puerto serie. Por defecto se lee en
+        # modo por tramas con los delimitadores del parser
+        configparser = config['configuracion parser']
+        configserial = dict(config['configuracion puerto serie'])
+        configserial.setdefault('framedelimiters',
+                                configparser['delimitadores'])
+        self.serialport = libs.serialport.SerialPort(configserial)
         self.serialport.connect()
 
         # Cargamos la configuracion de formato de datos
-        configparser = config['configuracion parser']
         self.parser = libs.parser.ParserFixedWidth(
             configparser['parametros'], configparser['delimitadores'])
 
         # Parametros configurables
         self.time_step = time_step  # intervalo en segundos
         self.output_folder = output_folder
+        # Con journal=True los ficheros no se reescriben en cada muestra:
+        # las filas nuevas o modificadas se añaden a un diario .jsonl y el
+        # JSON se compacta cada maxlines filas, cada compactinterval
+        # segundos, al cambiar de fichero (dia o año) y al cerrar
+        self.journal = journal
+        self.maxlines = maxlines
+        self.compactinterval = compactinterval
+        self.journals = {}
+        self.sources = {}
+        # Los ficheros modificados se marcan como pendientes y se escriben
+        # juntos cada flushinterval segundos (0: en cada muestra)
+        self.flushinterval = flushinterval
+        self.dirty = {}
+        self.lastflush = time.monotonic()
+        # Instantanea binaria (NPZ) del estado para arrancar rapido: se
+        # escribe cada snapshotevery muestras (tras escribir los ficheros)
+        # y al cerrar
+        self.snapshotfile = output_folder / 'snowwhite_snapshot.npz'
+        self.snapshotevery = snapshotevery
+        self.nsamples = 0
+        self.snapshotsamples = 0
         print(output_folder)
-        # Buffer datos
-        self.serialdata = pd.DataFrame()
-        self.swdata = pd.DataFrame()
+        # Ultimo registro recibido (namedtuple del parser compilado)
+        self.serialrecord = None
+        # Ventana de la ultima hora: buffer circular con un array por campo
+        # (con margen por si el muestreo se adelanta)
+        self.window = RingBuffer(self.parser.types,
+                                 2 * int(np.ceil(3600.0 / time_step)) + 1,
+                                 'actualdatetime')
+        self.swdataversion = None
+        self.swdatacache = pd.DataFrame()
         self.statdata = pd.DataFrame()
-        self.sampledata = pd.DataFrame(columns=[
+        # Filtros: registro indexado por la fecha de inicio del filtro
+        self.samples = SampleRegistry([
             'measuretime', 'duration', 'flowrate', 'errorflowrate', 'volume',
             'errorvolume', 'n', 'sum', 'sumsq'
         ])
+        self.sampledataversion = None
+        self.sampledatacache = None
+
+        # Si la instantanea es posterior a los ficheros de salida se carga
+        # ella sola; si no (p. ej. tras un cierre inesperado) se releen los
+        # ficheros JSON. La carga no se aplaza: justo despues se necesitan
+        # la ventana, statdata y el filtro activo para reconstruir los
+        # acumuladores de las horas y del filtro abiertos
+        if not self.load_snapshot():
+            self.load_outputs()
+
+        # Acumuladores de las horas abiertas: se rellenan con las muestras
+        # de la ventana posteriores a la ultima hora guardada
+        self.hourstats = {}
+        lasthour = (self.statdata['time'].max() if 'time' in self.statdata
+                    else pd.NaT)
+        for values in self.swdata.to_dict('records'):
+            if (pd.isna(lasthour) or
+                    values['actualdatetime'] > lasthour):
+                self.add_hourstats(values)
+
+        if self.samples.active is not None:
+            active = dict(zip(self.samples.columns, self.samples.active))
+            self.samplestats = CentralStats(active['n'], active['sum'],
+                                            active['sumsq'])
+        else:
+            self.samplestats = CentralStats(0.0, 0.0, 0.0)
 
-        swdatafile = output_folder / 'snowwhite_ultimahora.json'
-        if swdatafile.is_file():
-            self.swdata = pd.read_json(swdatafile, orient='table')
-
-        # Releeemos los datos horarios de los pasados 10 días
-        # esto es un loop sobre los ultimos 10 días
+        # Con un planificador compartido (el de la adquisicion) la
+        # escritura de los ficheros y la compactacion de los diarios son
+        # tareas propias: se ejecutan en el mismo hilo que receive_data, asi
+        # que no necesitan bloqueos, y la compactacion por antiguedad no
+        # depende de que lleguen muestras
+        self.scheduler = scheduler
+        self.flushjob = None
+        self.compactjob = None
+        if scheduler is not None:
+            if flushinterval > 0:
+                self.flushjob = scheduler.add(flushinterval, self.flush,
+                                              policy=COALESCE)
+            if journal and compactinterval:
+                self.compactjob = scheduler.add(compactinterval,
+                                                self.compact_due,
+                                                policy=COALESCE)
+
+    def output_files(self):
+        # Ficheros de salida que se leen al arrancar: ultima hora, datos
+        # horarios de los ultimos 10 dias y filtros del año
         today = pd.Timestamp.today()
         trange = 10
-        for statdate in (today - pd.Timedelta(trange - (1 + n), 'd')
-                         for n in range(trange)):
+        swdatafile = self.output_folder / 'snowwhite_ultimahora.json'
+        statdatafiles = [
+            (self.output_folder / statdate.strftime('%Y') /
+             ('snowwhite_datoshorarios_' + statdate.strftime('%y%m%d') +
+              '.json'))
+            for statdate in (today - pd.Timedelta(trange - (1 + n), 'd')
+                             for n in range(trange))
+        ]
+        sampledatafile = (self.output_folder / today.strftime('%Y') /
+                          ('filtros_' + today.strftime('%Y') + '.json'))
+        return swdatafile, statdatafiles, sampledatafile
 
-            statdatafile = (self.output_folder / statdate.strftime('%Y') /
-                            ('snowwhite_datoshorarios_' +
-                             statdate.strftime('%y%m%d') + '.json'))
+    def load_outputs(self):
+        swdatafile, statdatafiles, sampledatafile = self.output_files()
 
-            if statdatafile.is_file():
-                self.statdata = pd.concat([
-                    self.statdata,
-                    pd.read_json(statdatafile, orient='table')
-                ])
+        swdata = self.load_json(swdatafile, 'actualdatetime')
+        if swdata is not None:
+            for values in swdata.sort_values('actualdatetime').to_dict(
+                    'records'):
+                self.window.append(values)
+
+        # Releeemos los datos horarios de los pasados 10 días
+        for statdatafile in statdatafiles:
+            statdaydata = self.load_json(statdatafile, 'time')
+            if statdaydata is not None:
+                self.statdata = pd.concat([self.statdata, statdaydata])
 
         # SAMPLE DATATFRAME
-        sampledatafile = (self.output_folder / today.strftime('%Y') /
-                          ('filtros_' + today.strftime('%Y') + '.json'))
-        if sampledatafile.is_file():
-            self.sampledata = pd.read_json(sampledatafile, orient='table')
-            self.samplestats = CentralStats(self.sampledata['n'].iloc[-1],
-                                            self.sampledata['sum'].iloc[-1],
-                                            self.sampledata['sumsq'].iloc[-1])
-        else:
-            self.samplestats = CentralStats(0.0, 0.0, 0.0)
+        sampledata = self.load_json(sampledatafile, 'measuretime')
+        if sampledata is not None:
+            self.sampledata = sampledata
+
+    @staticmethod
+    def frame_arrays(df, prefix):
+        # Columnas de un DataFrame como arrays con tipo (sin objetos)
+        arrays = {prefix + '_columns': np.array(df.columns, dtype=str)}
+        df = df.infer_objects()
+        for n, column in enumerate(df.columns):
+            values = df[column].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            arrays[prefix + '_' + str(n)] = values
+        return arrays
+
+    @staticmethod
+    def array_frame(arrays, prefix):
+        columns = list(arrays[prefix + '_columns'])
+        return pd.DataFrame({column: arrays[prefix + '_' + str(n)]
+                             for n, column in enumerate(columns)},
+                            columns=columns)
+
+    def save_snapshot(self):
+        # Escritura atomica: fichero temporal y rename
+        self.snapshotsamples = self.nsamples
+        arrays = {'window_' + name: self.window[name]
+                  for name in self.window.names}
+        arrays.update(self.frame_arrays(self.statdata, 'stat'))
+        arrays.update(self.frame_arrays(self.sampledata, 'sample'))
+
+        self.output_folder.mkdir(parents=True, exist_ok=True)
+        tmpfile = self.snapshotfile.with_name(self.snapshotfile.name + '.tmp')
+        with open(tmpfile, 'wb') as snapshot:
+            np.savez(snapshot, **arrays)
+        os.replace(tmpfile, self.snapshotfile)
+
+    def load_snapshot(self):
+        if not self.snapshotfile.is_file():
+            return False
+
+        # Se descarta si algun fichero de salida (o su diario) es posterior
+        swdatafile, statdatafiles, sampledatafile = self.output_files()
+        snapshottime = self.snapshotfile.stat().st_mtime
+        for path in [swdatafile, sampledatafile] + statdatafiles:
+            for candidate in (path, path.with_suffix('.jsonl')):
+                if (candidate.is_file() and
+                        candidate.stat().st_mtime > snapshottime):
+                    return False
+
+        try:
+            with np.load(self.snapshotfile, allow_pickle=False) as arrays:
+                window = {name: arrays['window_' + name]
+                          for name in self.window.names}
+                statdata = self.array_frame(arrays, 'stat')
+                sampledata = self.array_frame(arrays, 'sample')
+        except (OSError, KeyError, ValueError):
+            return False
+
+        for n in range(len(window['actualdatetime'])):
+            self.window.append({name: window[name][n] for name in window})
+        self.statdata = statdata
+        if len(sampledata.columns) > 0:
+            self.sampledata = sampledata
+        return True
+
+    def close(self):
+        # Escribe lo pendiente, compacta los diarios y guarda la instantanea
+        # para el proximo arranque
+        for job in (self.flushjob, self.compactjob):
+            if job is not None:
+                self.scheduler.remove(job, wait=True)
+        self.flush(compact=True)
+        self.save_snapshot()
+
+    @property
+    def swdata(self):
+        # DataFrame de la ventana de la ultima hora, solo se reconstruye si
+        # la ventana ha cambiado
+        if self.swdataversion != self.window.version:
+            self.swdatacache = self.window.todataframe()
+            self.swdataversion = self.window.version
+        return self.swdatacache
+
+    @property
+    def sampledata(self):
+        # DataFrame de los filtros, solo se reconstruye si hay cambios
+        if self.sampledataversion != self.samples.version:
+            self.sampledatacache = self.samples.todataframe()
+            self.sampledataversion = self.samples.version
+        return self.sampledatacache
+
+    @sampledata.setter
+    def sampledata(self, df):
+        self.samples = SampleRegistry.fromdataframe(df)
+
+    @property
+    def serialdata(self):
+        # DataFrame de una fila con el ultimo registro (para la interfaz)
+        if self.serialrecord is None:
+            return pd.DataFrame()
+        return self.parser.todataframe(self.serialrecord)
 
     def receive_data(self):
         # Datos recibidos
-        self.serialdata = serialdata = self.get_serialdata()
+        record = self.get_serialdata()
+        if pd.isna(record.actualdatetime) or pd.isna(record.flowrate):
+            # Sin respuesta o trama incompleta: no se almacena
+            print('Trama descartada: ' + str(record))
+            return
+        self.serialrecord = record
 
-        # si status = 0 (bomba apagada) no almacenamos los datos
-        if serialdata.loc[0].status == 0:
+        # si status = 0 (bomba apagada) no almacenamos los datos, pero se
+        # cierran las horas ya terminadas
+        if record.status == 0:
+            self.save_statrows(self.close_hours(record.actualdatetime))
+            self.flush_due()
             return
 
         # DataFrame swdata:
@@ -87,67 +287,31 @@ class SnowWhiteData:
         # hora con
         # una frecuencia de self.time_step cuando la la bomba esta en
         # funcionamiento
-        self.swdata = pd.concat([self.swdata, serialdata])
-        self.save_json(self.swdata, None, self.output_folder,
-                       'snowwhite_ultimahora.json')
+        self.window.append(record)
+        self.nsamples = self.nsamples + 1
+        self.persist(lambda: self.swdata, record, None,
+                     self.output_folder, 'snowwhite_ultimahora.json',
+                     'actualdatetime')
 
         # DataFrame statdata:
         # Se guardan los datos estadisticos correspondientes a los
         # últimos diez días
         # con una frecuencia de una hora cuando la bomba está en funcionamiento
-        actualdatetime = self.serialdata.iloc[0].actualdatetime
-        actualdatehour = actualdatetime.round('H')
-        timehoursecs = timediffseconds(actualdatetime, actualdatehour)
-
-        if timehoursecs >= 0.0 and timehoursecs < self.time_step:
-            measuredatehour = actualdatehour - pd.Timedelta(hours=1)
-            data_lasthour = ((self.swdata.actualdatetime > measuredatehour) &
-                             (self.swdata.actualdatetime <= actualdatehour))
-            statrow = self.swdata[data_lasthour].copy()
-            # cuidado deben el tamaño debe ser mayor que uno
-            metrics = {
-                'flowrate': ['count', 'mean', 'std', 'sem'],
-                'Pdiff': ['count', 'mean', 'std', 'sem']
-            }
-            statrow = statrow.agg(metrics)
-            statrow = statrow.unstack().to_frame().T
-            statrow.columns = statrow.columns.map('{0[0]}_{0[1]}'.format)
-            # incluimos las fechas
-            statrow.insert(0, 'time', actualdatehour)
-            statrow.insert(1, 'measuretime', measuredatehour)
-
-            # Calculamos el volumen
-            statrow['volume'] = statrow.flowrate_mean * (
-                (statrow.flowrate_count * self.time_step) / 3600)
-            statrow['volume_error'] = statrow.flowrate_sem * (
-                (statrow.flowrate_count * self.time_step) / 3600)
-
-            self.statdata = pd.concat([self.statdata, statrow],
-                                      ignore_index=True)
-            # Se ordenan por fecha:
-            # los valores recientes al final del dataframe
-            self.statdata.sort_values(by='time', inplace=True)
-
-            # Guardamos los datos horarios del último día en un fichero
-            lastday = self.statdata.iloc[-1].measuretime.floor('D')
-            self.save_json(
-                self.statdata, lastday,
-                self.output_folder / lastday.strftime('%Y'),
-                'snowwhite_datoshorarios_' + lastday.strftime('%y%m%d') +
-                '.json')
+        # Las estadisticas de cada hora se acumulan muestra a muestra y la
+        # fila horaria se emite cuando llega la primera muestra de una hora
+        # posterior
+        actualdatetime = record.actualdatetime
+        self.add_hourstats(record._asdict())
+        self.save_statrows(self.close_hours(actualdatetime))
 
         # DataFrame sampledata:
         # Se guardan los datos estadisticos correspondientes a la
         # medida del filtro
-        startdatetime = serialdata.iloc[0].startdatetime
-        if startdatetime in self.sampledata['measuretime'].values:
-            locindex = self.sampledata.index[self.sampledata.measuretime ==
-                                             startdatetime]
-        else:
+        startdatetime = record.startdatetime
+        if startdatetime not in self.samples:
             self.samplestats.reset()
-            locindex = [len(self.sampledata)]
 
-        self.samplestats.add(serialdata.loc[0]['flowrate'])
+        self.samplestats.add(record.flowrate)
         smeanflow, svarflow, sstdflow, serrorflow = self.samplestats.get_stats(
         )
         nflow, sumflow, sumsqflow = self.samplestats.get_sums()
@@ -158,29 +322,181 @@ class SnowWhiteData:
             smeanflow * (duration / 3600.0), serrorflow * (duration / 3600.0),
             nflow, sumflow, sumsqflow
         ]
-        self.sampledata.loc[locindex[0]] = new_sample
+        self.samples.set(new_sample)
 
         # Guardamos las medidas de los filtros del último año
-        yeardate = (self.sampledata.iloc[-1].measuretime.floor('d') -
+        yeardate = (self.samples.active[0].floor('d') -
                     pd.tseries.offsets.YearBegin())
-        self.save_json(self.sampledata, yeardate,
-                       self.output_folder / yeardate.strftime('%Y'),
-                       'filtros_' + yeardate.strftime('%Y') + '.json')
+        self.persist(lambda: self.sampledata,
+                     self.samples.rowframe(startdatetime),
+                     yeardate, self.output_folder / yeardate.strftime('%Y'),
+                     'filtros_' + yeardate.strftime('%Y') + '.json',
+                     'measuretime')
+
+        self.flush_due()
+
+    def add_hourstats(self, values):
+        # La hora (H-1, H] se etiqueta con su final H
+        hour = pd.Timestamp(values['actualdatetime']).ceil('H')
+        if hour not in self.hourstats:
+            self.hourstats[hour] = {field: WelfordStats()
+                                    for field in HOURLY_FIELDS}
+        for field in HOURLY_FIELDS:
+            if not pd.isna(values[field]):
+                self.hourstats[hour][field].add(values[field])
+
+    def close_hours(self, actualdatetime):
+        # Filas horarias de las horas terminadas antes de actualdatetime
+        statrows = []
+        for hour in sorted(self.hourstats):
+            if hour >= actualdatetime:
+                break
+            statrows.append(self.statrow(hour, self.hourstats.pop(hour)))
+        return statrows
+
+    def statrow(self, hour, stats):
+        # Misma fila que agg(['count', 'mean', 'std', 'sem']) (ddof=1)
+        row = {'time': hour, 'measuretime': hour - pd.Timedelta(hours=1)}
+        for field in HOURLY_FIELDS:
+            mean, _, std, sem = stats[field].get_stats(ddof=1)
+            row[field + '_count'] = float(stats[field].n)
+            row[field + '_mean'] = mean
+            row[field + '_std'] = std
+            row[field + '_sem'] = sem
+
+        # Calculamos el volumen
+        row['volume'] = row['flowrate_mean'] * (
+            (row['flowrate_count'] * self.time_step) / 3600)
+        row['volume_error'] = row['flowrate_sem'] * (
+            (row['flowrate_count'] * self.time_step) / 3600)
+        return pd.DataFrame([row])
+
+    def save_statrows(self, statrows):
+        if not statrows:
+            return
+        statrow = pd.concat(statrows, ignore_index=True)
+        self.statdata = pd.concat([self.statdata, statrow],
+                                  ignore_index=True)
+        # Se ordenan por fecha:
+        # los valores recientes al final del dataframe
+        self.statdata.sort_values(by='time', inplace=True)
+
+        # Guardamos los datos horarios de cada día en su fichero. Cada fila
+        # va al fichero del dia de su measuretime (la hora que termina a
+        # medianoche es del dia anterior), aunque se cierren juntas horas
+        # de dias distintos
+        days = statrow.measuretime.dt.floor('D')
+        for day, rows in statrow.groupby(days):
+            nextday = day + pd.Timedelta(days=1)
+            self.persist(
+                lambda nextday=nextday: self.statdata[
+                    self.statdata.measuretime < nextday],
+                rows, day, self.output_folder / day.strftime('%Y'),
+                'snowwhite_datoshorarios_' + day.strftime('%y%m%d') +
+                '.json', 'time')
 
     def del_olddata(self):
 
         # Filtramos las medidas en  swdatadf y measuredf
-        actualdatetime = self.swdata.iloc[-1].actualdatetime
+        if self.window.empty:
+            return
+        actualdatetime = pd.Timestamp(self.window.last('actualdatetime'))
 
-        if not self.swdata.empty:
-            moving_lasthour = (self.swdata.actualdatetime >
-                               (actualdatetime - pd.Timedelta(hours=1)))
-            self.swdata = self.swdata[moving_lasthour]
+        # Se descartan del principio de la ventana las muestras de hace mas
+        # de una hora
+        self.window.expire(actualdatetime - pd.Timedelta(hours=1))
         if not self.statdata.empty:
             moving_lastweek = (self.statdata.measuretime >
                                actualdatetime - pd.Timedelta(weeks=1))
             self.statdata = self.statdata[moving_lastweek]
 
+    def load_json(self, path, key):
+        # Lee un fichero de salida y, en modo diario, tambien su diario. Un
+        # diario que quede de la sesion anterior se compacta al leerlo
+        if self.journal:
+            journal = JsonJournal(path, key, self.maxlines)
+            values = journal.load()
+            if journal.lines > 0:
+                journal.compact(values)
+            return values
+        if path.is_file():
+            return read_table_json(path)
+        return None
+
+    def persist(self, getdata, rows, inidate, folder, namefile, key):
+        # Marca folder / namefile como pendiente: contenido getdata() desde
+        # inidate y filas nuevas o modificadas rows, DataFrame o registro
+        # del parser (para el diario). No
+        # se escribe nada hasta el siguiente flush
+        path = folder / namefile
+        if path not in self.dirty:
+            self.dirty[path] = {'rows': [], 'key': key}
+        self.dirty[path].update(getdata=getdata, inidate=inidate,
+                                folder=folder, namefile=namefile)
+        self.dirty[path]['rows'].append(rows)
+
+    def flush_due(self):
+        # Con planificador la escritura es una tarea aparte
+        if self.flushjob is not None:
+            return
+        if time.monotonic() - self.lastflush >= self.flushinterval:
+            self.flush()
+
+    def flush(self, compact=False):
+        # Escribe los ficheros pendientes y, si toca, la instantanea. Con
+        # compact=True se compactan todos los diarios con filas
+        self.lastflush = time.monotonic()
+        dirty = self.dirty
+        self.dirty = {}
+        for path in dirty:
+            self.write_output(path, **dirty[path])
+
+        self.compact_due(compact)
+
+        if self.nsamples - self.snapshotsamples >= self.snapshotevery:
+            self.save_snapshot()
+
+    def write_output(self, path, getdata, rows, inidate, folder, namefile,
+                     key):
+        # Sin diario se reescribe el fichero completo. En modo diario solo
+        # se añade la ultima version de cada fila y el DataFrame completo
+        # solo se pide para compactar
+        if not self.journal:
+            self.save_json(getdata(), inidate, folder, namefile)
+            return
+
+        journal = self.journals.get(key)
+        if journal is not None and journal.path != path:
+            # Cambio de dia o de año: el fichero anterior se compacta con
+            # su propio contenido (JSON mas diario)
+            journal.compact()
+            journal = None
+        if journal is None:
+            journal = self.journals[key] = JsonJournal(
+                path, key, self.maxlines, self.compactinterval)
+        rows = [self.parser.todataframe(row)
+                if isinstance(row, self.parser.record) else row
+                for row in rows]
+        journal.append(pd.concat(rows, ignore_index=True).drop_duplicates(
+            key, keep='last'))
+        self.sources[key] = (getdata, inidate)
+
+    def compact_due(self, compact=False):
+        # Compacta los diarios con maxlines filas o mas antiguos que
+        # compactinterval (todos los que tengan filas con compact=True)
+        for key in self.journals:
+            journal = self.journals[key]
+            if journal.pending or (compact and journal.lines > 0):
+                self.compact(key)
+
+    def compact(self, key):
+        # Compacta el diario actual de key con el contenido en memoria
+        getdata, inidate = self.sources[key]
+        df = getdata()
+        if inidate is not None:
+            df = df[df.measuretime >= inidate]
+        self.journals[key].compact(df)
+
     @staticmethod
     def save_json(df, inidate, folder, namefile):
 
@@ -190,15 +506,15 @@ class SnowWhiteData:
         else:
             outputdf = df.copy()
 
+        # Escritura atomica: fichero temporal y rename
         folder.mkdir(parents=True, exist_ok=True)
-        outputdf.to_json(folder / namefile, orient='table', index=False)
+        write_table_json(outputdf, folder / namefile)
 
     def get_serialdata(self):
-        self.serialport.write("poll\r\n".encode())
+        self.serialport.poll("poll\r\n".encode())
         data = self.serialport.getdata()
 
         dt_now = pd.Timestamp.today()
         print(dt_now, data)
-        df = self.parser.lineparser(data)
-
-        return df
+        # Registro ligero del parser compilado, sin pasar por read_fwf
+        return self.parser.recordparser(data)
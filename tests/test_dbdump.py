@@ -0,0 +1,99 @@
+import sqlite3
+
+import pandas as pd
+
+from snowhite.dbdump import (DataBaseWriter, FileDataBase, MANAGERS,
+                             migrate_database)
+from snowhite.dataprocess import SnowWhiteDataProcess
+from snowhite.rollups import SnowWhiteRollups
+
+T0 = pd.Timestamp('2024-03-01 00:00:00')
+
+
+def read_table(filedb, table, key):
+    # Tabla completa con las fechas y duraciones ya convertidas
+    db = FileDataBase(filedb, readonly=True)
+    values = pd.concat(db.iter_range(table), ignore_index=True)
+    db.close()
+    return values.sort_values(key, ignore_index=True)
+
+
+def test_migrate_database_round_trip(tmp_path):
+    filedb = tmp_path / 'v1.db'
+    db = FileDataBase(filedb, version=1, buffersize=1000)
+    for seconds in range(0, 3 * 3600, 20):
+        fecha = T0 + pd.Timedelta(seconds=seconds)
+        db.insert_data(fecha, T0, fecha - T0, 1, 15.0, 600.0, 0.1,
+                       seconds / 10.0)
+    db.close()
+    db = FileDataBase(filedb)
+    db.update_hourly_data()
+    db.close()
+    SnowWhiteRollups(filedb).update()
+
+    tables = {'Valores_Tiempo_Real': 'FECHA', 'Valores_Horarios': 'FECHA',
+              'Rollup_Minuto': 'FECHA', 'Rollup_Hora': 'FECHA'}
+    before = {table: read_table(filedb, table, key)
+              for table, key in tables.items()}
+
+    assert migrate_database(filedb, chunksize=100)
+    assert not migrate_database(filedb)
+
+    connection = sqlite3.connect(filedb)
+    assert connection.execute('PRAGMA user_version').fetchone()[0] == 2
+    for table in tables:
+        types = connection.execute('SELECT DISTINCT typeof(FECHA) FROM ' +
+                                   table).fetchall()
+        assert types == [('integer', )]
+    marks = connection.execute(
+        'SELECT TIPO, typeof(FECHA) FROM Ultimos_Valores '
+        'WHERE FECHA IS NOT NULL').fetchall()
+    connection.close()
+    assert marks and all(kind == 'integer' for _, kind in marks)
+
+    for table, key in tables.items():
+        after = read_table(filedb, table, key)
+        pd.testing.assert_frame_equal(after, before[table],
+                                      check_dtype=False)
+
+
+def test_writer_counts_committed_rows(tmp_path):
+    filedb = tmp_path / 'writer.db'
+    writer = DataBaseWriter(filedb, buffersize=1000, flushtime=60.0)
+    writer.start()
+    for seconds in range(5):
+        fecha = T0 + pd.Timedelta(seconds=seconds)
+        writer.put((fecha, T0, fecha - T0, 1, 15.0, 600.0, 0.1, 1.0))
+    writer.put(('no es una fecha', T0, 'x', 1, 15.0, 600.0, 0.1, 1.0))
+
+    # Las filas en el buffer todavia no cuentan como escritas
+    assert writer.stats()['written'] == 0
+    assert writer.stop(timeout=10)
+
+    stats = writer.stats()
+    assert stats['received'] == 6
+    assert stats['written'] == 5
+    assert stats['rejected'] == 1
+    connection = sqlite3.connect(filedb)
+    assert connection.execute(
+        'SELECT COUNT(*) FROM Valores_Tiempo_Real').fetchone()[0] == 5
+    connection.close()
+
+
+def test_shared_connections_are_closed(tmp_path):
+    filedb = tmp_path / 'shared.db'
+    process = SnowWhiteDataProcess(filedb, 60)
+    writer = DataBaseWriter(filedb, buffersize=1, flushtime=60.0)
+    writer.start()
+    writer.put((T0, T0, pd.Timedelta(0), 1, 15.0, 600.0, 0.1, 1.0))
+    assert writer.stop(timeout=10)
+
+    db = FileDataBase(filedb, readonly=True)
+    assert len(db.get_dataframe('SELECT * FROM Valores_Tiempo_Real')) == 1
+    db.close()
+    # El proceso sigue usando las conexiones compartidas
+    assert str(filedb.resolve()) in MANAGERS
+
+    process.stop()
+    assert str(filedb.resolve()) not in MANAGERS
+    assert not (tmp_path / 'shared.db-wal').exists()
@@ -0,0 +1,28 @@
+from snowwhite.libs.history import History
+
+COLUMNS = ['inidate', 'enddate', 'flowrate']
+
+
+def test_duplicate_key_stays_until_last_row_expires():
+    history = History(COLUMNS, 3)
+    history.add((1, 2, 600.0))
+    history.add((1, 2, 601.0))
+    history.add((2, 3, 602.0))
+    history.add((3, 4, 603.0))
+
+    # Se descarta la primera medida con key 1 pero queda la segunda
+    assert len(history) == 3
+    assert 1 in history
+    history.add((4, 5, 604.0))
+    assert 1 not in history
+    assert [row['inidate'] for row in history.records()] == [4, 3, 2]
+
+
+def test_out_of_order_rows_are_sorted():
+    history = History(COLUMNS, 3)
+    for inidate in (1, 3, 2, 0):
+        history.add((inidate, inidate + 1, 600.0))
+
+    assert [row[0] for row in history.latest()] == [3, 2, 1]
+    assert 0 not in history
+    assert history.todataframe(2).inidate.tolist() == [3, 2]
@@ -0,0 +1,33 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from snowhite.jsonimport import import_json
+from snowwhite.libs.journal import JsonJournal
+
+
+def test_import_reads_journal_like_desktop(tmp_path):
+    out = tmp_path / 'out'
+    times = pd.date_range('2024-01-01', periods=50, freq='10s')
+    start = pd.Timestamp('2023-12-31 23:00')
+    values = pd.DataFrame({'startdatetime': start,
+                           'duration': times - start,
+                           'status': 1, 'Pdiff': 15.0, 'flowrate': 600.0,
+                           'airvolume': np.arange(50.0),
+                           'actualdatetime': times})
+    # JSON compactado mas un diario que repite parte de sus filas
+    journal = JsonJournal(out / 'snowwhite_ultimahora.json', 'actualdatetime')
+    journal.compact(values.iloc[:30])
+    journal.append(values.iloc[20:])
+    (out / 'filtros_2024.json').write_text('{roto')
+
+    filedb = tmp_path / 'import.db'
+    counts = import_json(filedb, out, workers=1)
+
+    assert counts['Valores_Tiempo_Real'] == len(journal.load()) == 50
+    assert counts['Valores_Filtro'] == 0
+    connection = sqlite3.connect(filedb)
+    assert connection.execute(
+        'SELECT COUNT(*) FROM Valores_Tiempo_Real').fetchone()[0] == 50
+    connection.close()
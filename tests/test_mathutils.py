@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from snowwhite.libs.mathutils import CentralStats, WelfordStats
+
+
+def test_welford_merge_matches_numpy():
+    values = np.random.default_rng(1).normal(600.0, 2.0, 10000)
+    parts = [WelfordStats.fromvalues(chunk)
+             for chunk in np.array_split(values, 7)]
+    stats = WelfordStats()
+    for part in parts:
+        stats.merge(part)
+    single = WelfordStats()
+    for value in values[:100]:
+        single.add(value)
+
+    assert stats.n == values.size
+    assert np.isclose(stats.mean, values.mean())
+    assert np.isclose(stats.variance(), values.var())
+    assert np.isclose(stats.variance(ddof=1), values.var(ddof=1))
+    assert np.isclose(single.variance(), values[:100].var())
+    assert np.isclose((parts[0] + parts[1]).mean,
+                      np.concatenate(np.array_split(values, 7)[:2]).mean())
+
+
+def test_central_stats_is_stable_with_large_mean():
+    values = 1e9 + np.arange(10, dtype=np.float64)
+    stats = CentralStats(0.0, 0.0, 0.0)
+    for value in values:
+        stats.add(value)
+    mean, variance, std, error = stats.get_stats()
+
+    assert mean == values.mean()
+    assert np.isclose(variance, values.var())
+    assert np.isclose(error, values.std() / np.sqrt(values.size))
+
+
+def test_central_stats_keeps_sums():
+    values = np.array([598.0, 600.5, 601.0, 603.25])
+    stats = CentralStats(0.0, 0.0, 0.0)
+    stats.add_many(values)
+    n, _sum, _sumsq = stats.get_sums()
+
+    assert n == values.size
+    assert np.isclose(_sum, values.sum())
+    assert np.isclose(_sumsq, np.dot(values, values))
+
+    restored = CentralStats(n, _sum, _sumsq)
+    restored.add(605.0)
+    expected = np.append(values, 605.0)
+    assert np.allclose(restored.get_stats()[:2],
+                       (expected.mean(), expected.var()))
+    with pytest.raises(AttributeError):
+        stats.other = 1.0
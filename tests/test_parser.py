@@ -0,0 +1,94 @@
+import copy
+import warnings
+
+import pandas as pd
+
+from snowhite.parser import ParserFixedWidth
+from snowhite.swclient import PARSER_CONFIG
+from snowwhite.libs import parser as desktopparser
+
+VALUES = {
+    'startdatetime': '05/03/2024 08:00:00',
+    'duration': '02:00:00',
+    'status': '1',
+    'Pdiff': '12.3',
+    'flowrate': '650.25',
+    'airvolume': '1234.56',
+    'actualdatetime': '05/03/2024 10:00:00',
+}
+
+
+def make_frame(**values):
+    # Trama de ancho fijo "S...E" con los campos de PARSER_CONFIG
+    values = dict(VALUES, **values)
+    body = [' '] * 142
+    for name, field in PARSER_CONFIG['parameters'].items():
+        ini, fin = field['position']
+        value = values.get(name, '0')
+        body[ini:fin] = list(value.rjust(fin - ini)[:fin - ini])
+    return 'S' + ''.join(body) + 'E'
+
+
+def parser_config(dtformat=None):
+    config = copy.deepcopy(PARSER_CONFIG)
+    if dtformat is not None:
+        for field in config['parameters'].values():
+            if field['type'] == 'datetime':
+                field['format'] = dtformat
+    return config
+
+
+def test_parsers_agree_on_dayfirst_dates():
+    frames = [make_frame(),
+              make_frame(actualdatetime='13/03/2024 10:00:00')]
+    expected = [pd.Timestamp('2024-03-05 10:00:00'),
+                pd.Timestamp('2024-03-13 10:00:00')]
+
+    for dtformat in (None, '%d/%m/%Y %H:%M:%S'):
+        parser = ParserFixedWidth(parser_config(dtformat))
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            records = [parser.recordparser(frame) for frame in frames]
+            byterecords = [parser.bytesparser(frame.encode())
+                           for frame in frames]
+            batch = parser.batchparser(frames)
+            lines = [parser.lineparser(frame) for frame in frames]
+
+        assert [record.actualdatetime for record in records] == expected
+        assert [record.actualdatetime for record in byterecords] == expected
+        assert list(pd.to_datetime(batch['actualdatetime'])) == expected
+        assert [line['actualdatetime'].iloc[0] for line in lines] == expected
+        assert records[0].startdatetime == pd.Timestamp('2024-03-05 08:00')
+        assert records[0].duration == pd.Timedelta(hours=2)
+        assert records[0].flowrate == 650.25
+
+
+def test_desktop_parser_agrees():
+    config = parser_config()
+    parser = desktopparser.ParserFixedWidth(config['parameters'],
+                                            config['delimiters'])
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        record = parser.recordparser(make_frame())
+        line = parser.lineparser(make_frame())
+
+    assert record.actualdatetime == pd.Timestamp('2024-03-05 10:00:00')
+    assert line['actualdatetime'].iloc[0] == record.actualdatetime
+    assert list(line.columns) == parser.names
+
+
+def test_configured_format_is_kept():
+    # Un valor que no cumple el formato configurado no lo sustituye
+    parser = ParserFixedWidth(parser_config('%d/%m/%Y %H:%M:%S'))
+    odd = parser.recordparser(make_frame(actualdatetime='03/13/2024 10:00:00'))
+    after = parser.recordparser(make_frame())
+
+    assert odd.actualdatetime == pd.Timestamp('2024-03-13 10:00:00')
+    assert after.actualdatetime == pd.Timestamp('2024-03-05 10:00:00')
+
+
+def test_blank_date_is_missing():
+    parser = ParserFixedWidth(parser_config())
+    record = parser.recordparser(make_frame(actualdatetime=''))
+
+    assert pd.isna(record.actualdatetime)
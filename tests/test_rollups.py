@@ -0,0 +1,77 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from snowhite.dbdump import FileDataBase, migrate_database
+from snowhite.rollups import SnowWhiteRollups
+
+T0 = pd.Timestamp('2024-03-01 00:00:00')
+
+
+def insert_samples(filedb, version, ini, fin, step=60):
+    # Muestras cada step segundos en [ini, fin) con un caudal variable
+    db = FileDataBase(filedb, version=version, buffersize=100000)
+    for seconds in range(ini, fin, step):
+        fecha = T0 + pd.Timedelta(seconds=seconds)
+        db.insert_data(fecha, T0, fecha - T0, 1, 15.0,
+                       600.0 + (seconds // step) % 7, 0.1, 1.0)
+    db.close()
+
+
+def update_hourly(filedb):
+    db = FileDataBase(filedb)
+    db.update_hourly_data()
+    db.close()
+
+
+def test_rollup_hora_matches_valores_horarios(tmp_path):
+    for version in (1, 2):
+        filedb = tmp_path / ('rollups_%d.db' % version)
+        rollups = SnowWhiteRollups(filedb, retention_days=1)
+        for day in range(3):
+            insert_samples(filedb, version, day * 86400, (day + 1) * 86400)
+            update_hourly(filedb)
+            rollups.update()
+
+        db = FileDataBase(filedb, readonly=True)
+        hourly = db.get_dataframe(
+            'SELECT FECHA, CAUDAL, VOLUMEN FROM Valores_Horarios')
+        hourly['FECHA'] = db.decode_time(hourly['FECHA'])
+        db.close()
+        hora = rollups.get_rollup('hora')
+
+        merged = hourly.merge(hora, on='FECHA', suffixes=('', '_rollup'))
+        assert len(merged) == len(hourly) > 24
+        assert np.allclose(merged.CAUDAL, merged.MEDIA)
+        assert np.allclose(merged.VOLUMEN, merged.VOLUMEN_rollup)
+
+        dia = rollups.get_rollup('dia')
+        assert np.isclose(
+            dia.VOLUMEN.sum(),
+            hora.loc[hora.FECHA <= dia.FECHA.max(), 'VOLUMEN'].sum())
+
+
+def test_rollups_survive_migration(tmp_path):
+    filedb = tmp_path / 'v1.db'
+    rollups = SnowWhiteRollups(filedb, retention_days=30)
+    insert_samples(filedb, 1, 0, 6 * 3600)
+    update_hourly(filedb)
+    rollups.update()
+    before = rollups.get_rollup('hora')
+
+    assert migrate_database(filedb)
+
+    insert_samples(filedb, 2, 6 * 3600, 12 * 3600)
+    update_hourly(filedb)
+    rollups.update()
+    after = rollups.get_rollup('hora')
+
+    connection = sqlite3.connect(filedb)
+    types = connection.execute(
+        'SELECT DISTINCT typeof(FECHA) FROM Rollup_Hora').fetchall()
+    connection.close()
+    assert types == [('integer', )]
+    pd.testing.assert_frame_equal(after.iloc[:len(before)], before)
+    assert after.FECHA.is_unique
+    assert after.FECHA.is_monotonic_increasing
@@ -0,0 +1,45 @@
+import time
+import threading
+
+from snowhite.utils.timer import Scheduler, COALESCE, SKIP
+
+
+def test_coalesce_jitter_is_measured_against_the_grid():
+    scheduler = Scheduler()
+    calls = []
+
+    def slow():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            time.sleep(0.35)
+
+    job = scheduler.add(0.1, slow, policy=COALESCE, aligned=False)
+    scheduler.start()
+    time.sleep(0.6)
+    scheduler.cancel()
+    scheduler.join()
+
+    # La ejecucion agrupada empieza ~0.05 s despues del ultimo tick perdido
+    assert job.missed >= 2
+    assert job.maxjitter >= 0.04
+
+
+def test_remove_waits_for_the_running_job():
+    scheduler = Scheduler()
+    started = threading.Event()
+    finished = []
+
+    def slow():
+        started.set()
+        time.sleep(0.3)
+        finished.append(True)
+
+    job = scheduler.add(0.05, slow, policy=SKIP, aligned=False)
+    scheduler.start()
+    started.wait(1.0)
+    scheduler.remove(job, wait=True)
+
+    assert finished == [True]
+    assert job not in scheduler.jobs
+    scheduler.cancel()
+    scheduler.join()